@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+"""Check confconsole start up imports against a budget
+
+Runs `python3 -X importtime -c "import confconsole"` (i.e. what every
+confconsole invocation pays before main() is even called) and fails if:
+
+- any module which should only be imported when used (the dialog UI, the
+  systemd journal, netinfo, or modules only used by plugins) is imported at
+  start up; or
+- the cumulative import time of confconsole exceeds the budget.
+
+Usage: bench/import_budget.py [--budget-ms=<ms>] [--runs=<n>]
+
+The best (lowest) of --runs runs is compared against the budget, to reduce
+noise. Exit status is 0 if within budget, 1 otherwise.
+"""
+
+import os
+import sys
+import getopt
+import subprocess
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+DEFAULT_BUDGET_MS = 60.0
+DEFAULT_RUNS = 5
+
+# modules which must not be imported just by importing confconsole
+DEFERRED_MODULES = {
+    "dialog",
+    "systemd",
+    "systemd.journal",
+    "netinfo",
+    "ipaddr",
+    "rtnetlink",
+    "shlex",
+    "importlib.abc",
+    "concurrent.futures",
+    "requests",
+    "smtplib",
+    "ssl",
+}
+
+
+def importtime(module: str) -> tuple[float, dict[str, float]]:
+    """Return (cumulative import time of module in ms, {module: cumulative
+    ms} of everything imported with it)"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr}")
+
+    imported = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            imported[name.strip()] = int(cumulative) / 1000
+        except ValueError:
+            continue  # header line
+    return imported[module], imported
+
+
+def main() -> None:
+    budget_ms = DEFAULT_BUDGET_MS
+    runs = DEFAULT_RUNS
+
+    try:
+        opts, _ = getopt.gnu_getopt(sys.argv[1:], "h", ["budget-ms=", "runs="])
+    except getopt.GetoptError as e:
+        print(f"Error: {e}\n{__doc__}", file=sys.stderr)
+        sys.exit(1)
+
+    for opt, val in opts:
+        if opt == "-h":
+            print(__doc__)
+            sys.exit(0)
+        elif opt == "--budget-ms":
+            budget_ms = float(val)
+        elif opt == "--runs":
+            runs = int(val)
+
+    best = None
+    imported: dict[str, float] = {}
+    for _ in range(runs):
+        total, imported = importtime("confconsole")
+        best = total if best is None else min(best, total)
+    assert best is not None
+
+    failed = False
+    unexpected = sorted(DEFERRED_MODULES.intersection(imported))
+    if unexpected:
+        failed = True
+        print(
+            "FAIL: imported at start up (should be deferred):"
+            f" {', '.join(unexpected)}"
+        )
+
+    if best > budget_ms:
+        failed = True
+        print(f"FAIL: import confconsole {best:.1f}ms > {budget_ms:.1f}ms")
+    else:
+        print(f"ok: import confconsole {best:.1f}ms <= {budget_ms:.1f}ms")
+
+    slowest = sorted(imported.items(), key=lambda x: x[1], reverse=True)
+    for name, ms in slowest[1:11]:
+        print(f"    {ms:8.1f}ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/python3
+"""Plugin start up and memory benchmarks over synthetic plugin trees
+
+Generates synthetic plugins.d trees (nested PluginDirs, executable plugins
+with docstrings, run() and some doOnce()) of each given size and, for each
+size and loading mode, measures in a fresh process:
+
+- PluginManager construction time
+- peak RSS of the process
+- Advanced menu build time (TurnkeyConsole._get_advmenu)
+- PluginDir menu build time (PluginDir.run for every directory)
+
+dialog.Dialog is replaced by a stub which returns immediately, so only
+menu building is measured. Results are written as JSON.
+
+Modes:
+    eager       - PluginManager(lazy=False), i.e. every plugin executed
+    lazy        - PluginManager(lazy=True), plugins parsed but not executed
+    index-cold  - lazy, with a new (empty) plugin index
+    index-warm  - lazy, with an up to date plugin index
+
+Usage: bench/plugin_startup.py [options]
+
+Options:
+    --sizes=<n>[,<n>...]  Number of plugins per tree (default: 10,100,1000)
+    --modes=<m>[,<m>...]  Modes to benchmark (default: all)
+    --repeat=<n>          Runs per size/mode; best is reported (default: 3)
+    --output=<file>       Write JSON to file rather than stdout
+
+"""
+
+import os
+import sys
+import json
+import time
+import getopt
+import shutil
+import tempfile
+import subprocess
+from types import ModuleType
+from typing import Any
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+MODES = ["eager", "lazy", "index-cold", "index-warm"]
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_REPEAT = 3
+
+# plugins per (sub)directory; directories are nested 2 deep
+PLUGINS_PER_DIR = 5
+
+PLUGIN_TEMPLATE = '''"""Synthetic plugin {n}"""
+
+import os
+import subprocess
+
+TITLE = "Synthetic plugin {n}"
+VALUES = [{values}]
+
+
+def helper(value: int) -> str:
+    return os.path.join("/tmp", str(value))
+
+{do_once}
+def run():
+    console.msgbox(TITLE, helper(len(VALUES)))
+'''
+
+DO_ONCE_TEMPLATE = '''
+def doOnce():
+    eventManager.add_event("synthetic_{n}")
+
+'''
+
+
+def make_tree(root: str, size: int) -> None:
+    """Create a synthetic plugin tree of `size` plugins under `root`"""
+    os.makedirs(root)
+    for n in range(size):
+        group = n // PLUGINS_PER_DIR
+        if group == 0:
+            dir_path = root
+        else:
+            top = f"{(group - 1) // PLUGINS_PER_DIR:03d}_Group"
+            sub = f"{(group - 1) % PLUGINS_PER_DIR:03d}_Sub"
+            dir_path = os.path.join(root, top, sub)
+            for path in (os.path.join(root, top), dir_path):
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+                    with open(os.path.join(path, "description"), "w") as fob:
+                        fob.write(f"Synthetic {os.path.basename(path)}\n")
+
+        plugin_path = os.path.join(dir_path, f"{n:04d}_plugin.py")
+        with open(plugin_path, "w") as fob:
+            fob.write(
+                PLUGIN_TEMPLATE.format(
+                    n=n,
+                    values=", ".join(str(i) for i in range(20)),
+                    do_once=DO_ONCE_TEMPLATE.format(n=n) if n % 5 == 0 else "",
+                )
+            )
+        os.chmod(plugin_path, 0o755)
+
+
+def _stub_dialog() -> None:
+    """Install a stub `dialog` module which doesn't draw anything"""
+
+    class Dialog:
+        OK = "ok"
+
+        def __init__(self, *args: Any, **kwargs: Any) -> None: ...
+
+        def add_persistent_args(self, args: list[str]) -> None: ...
+
+        def menu(self, *args: Any, **kwargs: Any) -> tuple[str, str]:
+            return ("cancel", "")
+
+    class DialogError(Exception):
+        message = ""
+
+    stub = ModuleType("dialog")
+    setattr(stub, "Dialog", Dialog)
+    setattr(stub, "DialogError", DialogError)
+    sys.modules["dialog"] = stub
+
+
+def child(tree: str, mode: str, index: str) -> dict[str, Any]:
+    """Run one measurement (in this process) and return results"""
+    import resource
+
+    sys.path.insert(0, SRC_DIR)
+    os.chdir(SRC_DIR)  # for conf/confconsole.conf
+    _stub_dialog()
+
+    import plugin
+    import confconsole
+
+    em = plugin.EventManager()
+    kwargs: dict[str, Any] = {"lazy": mode != "eager"}
+    if mode.startswith("index"):
+        kwargs["index"] = index
+
+    start = time.perf_counter()
+    pm = plugin.PluginManager(
+        tree, {"eventManager": em, "interactive": False}, **kwargs
+    )
+    construct = time.perf_counter() - start
+
+    console = confconsole.Console("bench")
+    pm.updateGlobals({"console": console})
+
+    # build TurnkeyConsole without probing the host (hostname, installer)
+    tc = confconsole.TurnkeyConsole.__new__(confconsole.TurnkeyConsole)
+    tc.console = console
+    tc.pluginManager = pm
+    tc.eventManager = em
+    tc.installer = confconsole.Installer(path="/nonexistent")
+    confconsole.PLUGIN_PATH = pm.plugin_path
+
+    renders = 20
+    start = time.perf_counter()
+    for _ in range(renders):
+        tc._get_advmenu()
+    advmenu = (time.perf_counter() - start) / renders
+
+    plugin_dirs = [
+        p for p in pm.path_map.values() if isinstance(p, plugin.PluginDir)
+    ]
+    start = time.perf_counter()
+    for plugin_dir in plugin_dirs:
+        plugin_dir.run()
+    plugindir = time.perf_counter() - start
+
+    return {
+        "construct_ms": round(construct * 1000, 3),
+        "advmenu_ms": round(advmenu * 1000, 3),
+        "plugindir_menus": len(plugin_dirs),
+        "plugindir_run_total_ms": round(plugindir * 1000, 3),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_child(tree: str, mode: str, index: str) -> dict[str, Any]:
+    proc = subprocess.run(
+        [
+            sys.executable,
+            os.path.realpath(__file__),
+            "--child",
+            f"--tree={tree}",
+            f"--mode={mode}",
+            f"--index={index}",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark ({mode}) failed:\n{proc.stderr}")
+    return json.loads(proc.stdout)
+
+
+def usage(msg: str = "") -> None:
+    if msg:
+        print(f"Error: {msg}", file=sys.stderr)
+    print(__doc__.strip(), file=sys.stderr)
+    sys.exit(1)
+
+
+def main() -> None:
+    sizes = DEFAULT_SIZES
+    modes = MODES
+    repeat = DEFAULT_REPEAT
+    output = None
+    child_args: dict[str, str] = {}
+
+    try:
+        l_opts = [
+            "sizes=", "modes=", "repeat=", "output=",
+            "child", "tree=", "mode=", "index=",
+        ]
+        opts, _ = getopt.gnu_getopt(sys.argv[1:], "h", l_opts)
+    except getopt.GetoptError as e:
+        usage(str(e))
+
+    for opt, val in opts:
+        if opt == "-h":
+            usage()
+        elif opt == "--sizes":
+            sizes = [int(size) for size in val.split(",")]
+        elif opt == "--modes":
+            modes = val.split(",")
+            for mode in modes:
+                if mode not in MODES:
+                    usage(f"unknown mode: {mode}")
+        elif opt == "--repeat":
+            repeat = int(val)
+        elif opt == "--output":
+            output = val
+        else:
+            child_args[opt[2:]] = val
+
+    if "child" in child_args:
+        results = child(
+            child_args["tree"], child_args["mode"], child_args["index"]
+        )
+        print(json.dumps(results))
+        return
+
+    records = []
+    tmp_dir = tempfile.mkdtemp(prefix="confconsole-bench-")
+    try:
+        for size in sizes:
+            tree = os.path.join(tmp_dir, f"plugins-{size}.d")
+            make_tree(tree, size)
+            for mode in modes:
+                index = os.path.join(tmp_dir, f"index-{size}-{mode}.json")
+                best: dict[str, Any] = {}
+                for _ in range(repeat):
+                    if mode == "index-cold" and os.path.exists(index):
+                        os.remove(index)
+                    elif mode == "index-warm" and not os.path.exists(index):
+                        run_child(tree, mode, index)  # populate index
+                    result = run_child(tree, mode, index)
+                    for key, value in result.items():
+                        best[key] = min(best.get(key, value), value)
+                records.append({"plugins": size, "mode": mode, **best})
+                print(
+                    f"{size:>5} plugins {mode:>10}:"
+                    f" construct {best['construct_ms']:9.2f}ms"
+                    f" advmenu {best['advmenu_ms']:7.3f}ms"
+                    f" rss {best['peak_rss_kb']}KiB",
+                    file=sys.stderr,
+                )
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    report = {
+        "python": sys.version.split()[0],
+        "repeat": repeat,
+        "results": records,
+    }
+    if output:
+        with open(output, "w") as fob:
+            json.dump(report, fob, indent=2)
+            fob.write("\n")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,37 @@
 
 import re
 import os
+import select
+import logging
+import threading
+from typing import Callable
+
+import inotify
+
+log = logging.getLogger(__name__)
+
+# fired (by the console) when confconsole.conf changes; see ConfWatcher
+CHANGED_EVENT = "conf_changed"
 
 
 class ConfconsoleConfError(Exception):
     pass
 
 
+# filename -> path found by `path`
+_paths: dict[str, str] = {}
+
+
 def path(filename: str) -> str:
+    # memoised; revalidated with a single stat
+    cached = _paths.get(filename)
+    if cached is not None and os.path.exists(cached):
+        return cached
+
     for dir in ("conf", "/etc/confconsole"):
         path = os.path.join(dir, filename)
         if os.path.exists(path):
+            _paths[filename] = path
             return path
 
     raise ConfconsoleConfError(
@@ -27,6 +48,14 @@ class Conf:
     publicip_cmd: str | None
     networking: bool
     copy_paste: bool
+    background_plugins: bool
+    watch_plugins: bool
+    isolate_plugins: bool
+    plugin_timeout: int
+    async_events: bool
+    event_timeout: int
+    event_bus: bool
+    dhcp_timeout: int
     conf_file: str
 
     def _load_conf(self) -> None:
@@ -51,6 +80,22 @@ class Conf:
                     pass
                 elif op == "copy_paste" and val.lower() in ("true", "false"):
                     self.copy_paste = True if val.lower() == "true" else False
+                elif op == "background_plugins" and val in ("true", "false"):
+                    self.background_plugins = True if val == "true" else False
+                elif op == "watch_plugins" and val in ("true", "false"):
+                    self.watch_plugins = True if val == "true" else False
+                elif op == "isolate_plugins" and val in ("true", "false"):
+                    self.isolate_plugins = True if val == "true" else False
+                elif op == "plugin_timeout" and val.isdigit():
+                    self.plugin_timeout = int(val)
+                elif op == "async_events" and val in ("true", "false"):
+                    self.async_events = True if val == "true" else False
+                elif op == "event_timeout" and val.isdigit():
+                    self.event_timeout = int(val)
+                elif op == "event_bus" and val in ("true", "false"):
+                    self.event_bus = True if val == "true" else False
+                elif op == "dhcp_timeout" and val.isdigit() and int(val) > 0:
+                    self.dhcp_timeout = int(val)
                 else:
                     raise ConfconsoleConfError(
                         f"illegal configuration line: {line}"
@@ -61,11 +106,189 @@ class Conf:
         self.publicip_cmd = None
         self.networking = True
         self.copy_paste = True
+        self.background_plugins = False
+        self.watch_plugins = False
+        self.isolate_plugins = False
+        self.plugin_timeout = 0
+        self.async_events = False
+        self.event_timeout = 0
+        self.event_bus = False
+        self.dhcp_timeout = 60
         self.conf_file = path("confconsole.conf")
         self._load_conf()
 
     def set_default_nic(self, ifname: str) -> None:
+        """Set default_nic, keeping the rest of the configuration file"""
         self.default_nic = ifname
 
+        lines = []
+        if os.path.exists(self.conf_file):
+            with open(self.conf_file) as fob:
+                lines = fob.readlines()
+
+        new_line = f"default_nic {ifname}\n"
+        updated = []
+        for line in lines:
+            if re.split(r"\s+", line.strip(), 1)[0] == "default_nic":
+                if new_line not in updated:
+                    updated.append(new_line)
+            else:
+                updated.append(line)
+        if new_line not in updated:
+            if updated and not updated[-1].endswith("\n"):
+                updated[-1] += "\n"
+            updated.append(new_line)
+
         with open(self.conf_file, "w") as fob:
-            fob.write(f"default_nic {ifname}\n")
+            fob.writelines(updated)
+
+
+_conf: Conf | None = None
+_conf_key: tuple[str, int, int, int] | None = None
+_conf_lock = threading.Lock()
+# set whilst a ConfWatcher is running
+_watched = False
+
+
+def get_conf() -> Conf:
+    """Return the shared Conf; confconsole.conf is only re-read when it has
+    changed (i.e. its mtime, size or inode). Whilst a ConfWatcher is running
+    the file isn't checked at all; the watcher invalidates the Conf."""
+    global _conf, _conf_key
+
+    conf = _conf
+    if _watched and conf is not None:
+        return conf
+
+    conf_file = path("confconsole.conf")
+    try:
+        st = os.stat(conf_file)
+        key = (conf_file, st.st_mtime_ns, st.st_size, st.st_ino)
+    except FileNotFoundError:
+        key = None
+    with _conf_lock:
+        if _conf is None or key is None or key != _conf_key:
+            _conf = Conf()
+            _conf_key = key
+        return _conf
+
+
+def invalidate() -> None:
+    """Discard the shared Conf (see `get_conf`) and memoised paths"""
+    global _conf, _conf_key
+
+    with _conf_lock:
+        _conf = None
+        _conf_key = None
+        _paths.clear()
+
+
+class ConfWatcher:
+    """Watch confconsole.conf (via inotify, on a thread) and, when it is
+    changed, invalidate the shared Conf and call `on_change` (e.g. to fire
+    CHANGED_EVENT), so changes made whilst the console is running are used
+    without restarting it, or checking the file each time it's used.
+
+    The file's directory is watched, as editors (and automation) commonly
+    replace the file rather than writing to it.
+    """
+
+    MASK = (
+        inotify.IN_CLOSE_WRITE
+        | inotify.IN_MOVED_TO
+        | inotify.IN_MOVED_FROM
+        | inotify.IN_DELETE
+    )
+
+    def __init__(self, on_change: Callable[[], object] | None = None):
+        self.on_change = on_change
+        self._inotify: inotify.Inotify | None = None
+        self._wake: tuple[int, int] | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start watching; raises ConfconsoleConfError if inotify isn't
+        available"""
+        global _watched
+
+        if self._thread is not None:
+            return
+        conf_file = os.path.abspath(path("confconsole.conf"))
+        try:
+            watcher = inotify.Inotify()
+        except inotify.InotifyError as e:
+            raise ConfconsoleConfError(str(e))
+        try:
+            watcher.add_watch(
+                os.path.dirname(conf_file), self.MASK | inotify.IN_ONLYDIR
+            )
+        except inotify.InotifyError as e:
+            watcher.close()
+            raise ConfconsoleConfError(str(e))
+
+        self._inotify = watcher
+        self._wake = os.pipe()
+        self._thread = threading.Thread(
+            target=self._watch,
+            args=(os.path.basename(conf_file),),
+            name="conf-watcher",
+            daemon=True,
+        )
+        # nothing may have changed between reading the file and watching it
+        invalidate()
+        with _conf_lock:
+            _watched = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        global _watched
+
+        thread, wake = self._thread, self._wake
+        if thread is None or wake is None:
+            return
+        with _conf_lock:
+            _watched = False
+        os.write(wake[1], b"x")
+        thread.join()
+        for fd in wake:
+            os.close(fd)
+        self._thread = self._wake = None
+
+    def _watch(self, name: str) -> None:
+        global _watched
+
+        watcher, wake = self._inotify, self._wake
+        assert watcher is not None and wake is not None
+        try:
+            while True:
+                ready = select.select([watcher, wake[0]], [], [])[0]
+                if wake[0] in ready:
+                    break
+                changed = False
+                for event in watcher.read():
+                    if event.mask & inotify.IN_IGNORED:
+                        # watched directory was removed
+                        log.warning(
+                            f"stopped watching {event.watch_path}: removed"
+                        )
+                        with _conf_lock:
+                            _watched = False
+                        invalidate()
+                        return
+                    if event.name == name or event.mask & (
+                        inotify.IN_Q_OVERFLOW
+                    ):
+                        changed = True
+                if not changed:
+                    continue
+
+                invalidate()
+                log.info(f"{name} changed")
+                if self.on_change is not None:
+                    try:
+                        self.on_change()
+                    except Exception:
+                        log.exception(f"handling {name} change failed")
+        finally:
+            watcher.close()
+            self._inotify = None
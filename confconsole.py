@@ -7,6 +7,16 @@ Options:
         --usage          Display usage screen without Advanced Menu
         --nointeractive  Do not display interactive dialog
         --plugin=<name>  Run plugin directly
+        --plugins=<name>[,<name>...]
+                         Run several plugins directly, in one process; with
+                         --nointeractive plugins are run concurrently where
+                         their declared dependencies and locks allow
+        --manifest=<file>
+                         As --plugins, with plugin names read from file (one
+                         per line)
+        --profile-startup
+                         Record start up timings to the journal and to
+                         /run/confconsole/startup-profile.json
 
 """
 
@@ -16,20 +26,17 @@ import sys
 import subprocess
 from subprocess import CalledProcessError
 import getopt
-import shlex
-from string import Template
-from io import StringIO
-import traceback
+from functools import partial
 
-import dialog
-from dialog import DialogError
-from systemd.journal import JournalHandler
-import netinfo
+# NOTE: the dialog UI, systemd journal and netinfo (and other less commonly
+# used modules) are imported where used, so that runs which don't need them
+# (e.g. --help or --nointeractive --plugin=...) don't pay for importing them
 
-import ipaddr
 import ifutil
 import conf
 import plugin
+import profiler
+import inotify
 
 from typing import NoReturn, Iterable, Any
 
@@ -37,14 +44,48 @@ USAGE: str = __doc__ if __doc__ else ""
 PLUGIN_PATH = os.path.join(
     os.path.dirname(os.path.realpath(__file__)), "plugins.d"
 )
+# local plugin directories, in order of increasing precedence; a plugin here
+# replaces the plugin with the same path (relative to plugins.d) in
+# PLUGIN_PATH or an earlier overlay
+PLUGIN_OVERLAYS = [
+    "/usr/local/lib/confconsole/plugins.d",
+    "/etc/confconsole/plugins.d",
+]
+PLUGIN_INDEX = "/var/cache/confconsole/plugins.json"
+# seconds; conf.CHANGED_EVENT is fired once confconsole.conf has settled
+CONF_CHANGED_DEBOUNCE = 0.5
 
-handler = JournalHandler()
-handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
-logging.getLogger().setLevel(logging.DEBUG)
-logging.getLogger().addHandler(handler)
 log = logging.getLogger(__name__)
 
 
+class LazyJournalHandler(logging.Handler):
+    """Log handler which sends records to the systemd journal; the journal
+    module is only imported once there is something to log"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._handler: logging.Handler | None = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            with self.lock:
+                if self._handler is None:
+                    from systemd.journal import JournalHandler
+
+                    self._handler = JournalHandler()
+                    self._handler.setFormatter(self.formatter)
+            self._handler.emit(record)
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging() -> None:
+    handler = LazyJournalHandler()
+    handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+    logging.getLogger().setLevel(logging.DEBUG)
+    logging.getLogger().addHandler(handler)
+
+
 class ConfconsoleError(Exception):
     pass
 
@@ -92,6 +133,8 @@ class Console:
         width: int = 65,
         height: int = 25,
     ) -> None:
+        import dialog
+
         self.width = width
         self.height = height
 
@@ -100,7 +143,7 @@ class Console:
         self.console.add_persistent_args(["--ok-label", "Select"])
         self.console.add_persistent_args(["--cancel-label", "Back"])
         self.console.add_persistent_args(["--colors"])
-        if conf.Conf().copy_paste:
+        if conf.get_conf().copy_paste:
             self.console.add_persistent_args(["--no-mouse"])
         if title:
             self.console.add_persistent_args(["--backtitle", title])
@@ -120,6 +163,11 @@ class Console:
         *args: Any,
         **kws: Any,
     ) -> WrapperReturn:
+        from dialog import DialogError
+
+        if profiler.active:
+            profiler.active.mark("first_paint", dialog)
+            profiler.active.finish()
         try:
             method = getattr(self.console, dialog)
         except AttributeError:
@@ -299,6 +347,8 @@ class TurnkeyConsole:
             with open("/etc/appname", 'r') as fob:
                 self.appname = fob.read().rstrip()
         except FileNotFoundError:
+            import netinfo
+
             self.appname = f"TurnKey Linux {netinfo.get_hostname().upper()}"
 
         self.installer = Installer(path="/usr/bin/di-live")
@@ -309,8 +359,21 @@ class TurnkeyConsole:
         self.pluginManager = pluginManager
         self.pluginManager.updateGlobals({"console": self.console})
 
+        self._network: ifutil.NetworkSnapshot | None = None
+
+        self.worker = None
+        config = conf.get_conf()
+        if config.isolate_plugins:
+            from pluginworker import PluginWorker
+
+            self.worker = PluginWorker(
+                pluginManager, self.console, config.plugin_timeout
+            )
+
     @staticmethod
     def _get_filtered_ifnames() -> list[str]:
+        import netinfo
+
         ifnames = []
         for ifname in netinfo.get_ifnames():
             if ifname.startswith(
@@ -320,48 +383,35 @@ class TurnkeyConsole:
             ifnames.append(ifname)
 
         # handle bridged LXC where br0 is the default outward-facing interface
-        defifname = conf.Conf().default_nic
+        defifname = conf.get_conf().default_nic
         if defifname and defifname.startswith("br"):
             ifnames.append(defifname)
-            bridgedif = (
-                subprocess.run(
-                    ["brctl", "show", defifname],
-                    capture_output=True,
-                    text=True,
-                )
-                .stdout.split("\n")[1]
-                .split("\t")[-1]
-            )
-            ifnames.remove(bridgedif)
+            for bridgedif in ifutil.get_bridge_ports(defifname):
+                if bridgedif in ifnames:
+                    ifnames.remove(bridgedif)
 
         ifnames.sort()
         return ifnames
 
-    @classmethod
-    def _get_default_nic(cls) -> str | None:
-        def _validip(ifname: str) -> bool:
-            ip = ifutil.get_ipconf(ifname)[0]
-            if ip and not ip.startswith("169"):
-                return True
-            ip6 = ifutil.get_ipv6conf(ifname)[0]
-            if ip6:
-                return True
-            return False
-
-        defifname = conf.Conf().default_nic
-        if defifname and _validip(defifname):
-            return defifname
-
-        for ifname in cls._get_filtered_ifnames():
-            if _validip(ifname):
-                return ifname
+    @property
+    def network(self) -> ifutil.NetworkSnapshot:
+        """Network configuration; gathered (at most) once per screen, see
+        `loop`"""
+        if self._network is None:
+            self._network = ifutil.NetworkSnapshot(
+                self._get_filtered_ifnames(), conf.get_conf().default_nic
+            )
+        return self._network
 
-        return None
+    def _get_default_nic(self) -> str | None:
+        return self.network.default_nic
 
     @classmethod
     def _get_public_ipaddr(cls) -> str | None:
-        publicip_cmd = conf.Conf().publicip_cmd
+        publicip_cmd = conf.get_conf().publicip_cmd
         if publicip_cmd:
+            import shlex
+
             command = subprocess.run(
                 shlex.split(publicip_cmd),
                 capture_output=True,
@@ -378,7 +428,7 @@ class TurnkeyConsole:
         list[tuple[str, str]], dict[str, plugin.Plugin | plugin.PluginDir]
     ]:
         items = []
-        if conf.Conf().networking:
+        if conf.get_conf().networking:
             items.append(("Networking", "Configure appliance networking"))
 
         if self.installer.available:
@@ -386,23 +436,14 @@ class TurnkeyConsole:
 
         plugin_map = {}
 
-        for path in self.pluginManager.path_map:
-            plug = self.pluginManager.path_map[path]
-            if os.path.dirname(path) == PLUGIN_PATH:
-                if isinstance(plug, plugin.Plugin) and hasattr(
-                    plug.module, "run"
-                ):
-                    items.append(
-                        (
-                            plug.module_name.capitalize(),
-                            str(plug.module.__doc__),
-                        )
-                    )
-                elif isinstance(plug, plugin.PluginDir):
-                    items.append(
-                        (plug.module_name.capitalize(), plug.description)
-                    )
-                plugin_map[plug.module_name.capitalize()] = plug
+        # plugins may still be loading in the background
+        self.pluginManager.wait()
+        for plug in self.pluginManager.getByDir(PLUGIN_PATH):
+            if isinstance(plug, plugin.Plugin) and plug.has_run:
+                items.append((plug.module_name.capitalize(), plug.description))
+            elif isinstance(plug, plugin.PluginDir):
+                items.append((plug.module_name.capitalize(), plug.description))
+            plugin_map[plug.module_name.capitalize()] = plug
 
         items.append(("Reboot", "Reboot the appliance"))
         items.append(("Shutdown", "Shutdown the appliance"))
@@ -412,9 +453,10 @@ class TurnkeyConsole:
 
     def _get_netmenu(self) -> list[tuple[str, str]]:
         menu = []
-        for ifname in self._get_filtered_ifnames():
-            addr = ifutil.get_ipconf(ifname)[0]
-            ifmethod = ifutil.get_ifmethod(ifname)
+        for ifname in self.network.ifnames:
+            ifconf = self.network.get_ipconf(ifname)
+            addr = ifconf.address
+            ifmethod = ifconf.method
 
             if addr:
                 desc = addr
@@ -437,15 +479,17 @@ class TurnkeyConsole:
 
         if (
             not ifname == self._get_default_nic()
-            and len(self._get_filtered_ifnames()) > 1
-            and ifutil.get_ipconf(ifname)[0] is not None
+            and len(self.network.ifnames) > 1
+            and self.network.get_ipconf(ifname).address is not None
         ):
             menu.append(("Default", "Show this adapter's IP address in Usage"))
 
         return menu
 
     def _get_ifconftext(self, ifname: str) -> str:
-        addr, netmask, gateway, nameservers = ifutil.get_ipconf(ifname)
+        ifconf = self.network.get_ipconf(ifname)
+        addr, netmask = ifconf.address, ifconf.netmask
+        gateway, nameservers = ifconf.gateway, ifconf.nameservers
         if addr is None:
             msg = "Network adapter is not configured"
             log.warning(msg)
@@ -459,19 +503,19 @@ class TurnkeyConsole:
         text += f"Netmask:         {netmask}\n"
         text += f"Default Gateway: {gateway}\n"
         text += f"Name Server(s):  {nameserver_str}\n"
-        ipv6_addr, ipv6_prefix = ifutil.get_ipv6conf(ifname)
+        ipv6_addr, ipv6_prefix = self.network.get_ipv6conf(ifname)
         if ipv6_addr:
             log.info(f"ipv6: {ipv6_addr}/{ipv6_prefix}")
             text += f"IPv6 Address: {ipv6_addr}/{ipv6_prefix}\n"
         text += "\n"
 
-        ifmethod = ifutil.get_ifmethod(ifname)
+        ifmethod = ifconf.method
         if ifmethod:
             conf_method = f"Networking configuration method: {ifmethod}"
             log.info(conf_method)
             text += conf_method + "\n"
 
-        if len(self._get_filtered_ifnames()) > 1:
+        if len(self.network.ifnames) > 1:
             text += "Is this adapter's IP address displayed in Usage: "
             if ifname == self._get_default_nic():
                 text += "yes\n"
@@ -489,7 +533,7 @@ class TurnkeyConsole:
             default_return_value = "quit"
 
         # if no interfaces at all - display error and go to advanced
-        if len(self._get_filtered_ifnames()) == 0:
+        if len(self.network.ifnames) == 0:
             error = "No network adapters detected"
             log.exception(error)
             if not self.advanced_enabled:
@@ -530,8 +574,12 @@ class TurnkeyConsole:
         # display usage
         ip_addr = self._get_public_ipaddr()
         if not ip_addr:
-            ip_addr = ifutil.get_ipconf(ifname)[0]
-        ipv6_addr, ipv6_prefix = ifutil.get_ipv6conf(ifname)
+            ip_addr = self.network.get_ipconf(ifname).address
+        ipv6_addr, ipv6_prefix = self.network.get_ipv6conf(ifname)
+
+        import netinfo
+        from string import Template
+
         hostname = netinfo.get_hostname().upper()
 
         try:
@@ -578,7 +626,7 @@ class TurnkeyConsole:
     def advanced(self) -> str:
         # dont display cancel button when no interfaces at all
         no_cancel = False
-        if len(self._get_filtered_ifnames()) == 0:
+        if len(self.network.ifnames) == 0:
             no_cancel = True
 
         items, plugin_map = self._get_advmenu()
@@ -599,7 +647,7 @@ class TurnkeyConsole:
         return "_adv_" + choice.lower()
 
     def networking(self) -> str:
-        ifnames = self._get_filtered_ifnames()
+        ifnames = self.network.ifnames
 
         # if no interfaces at all - display error and go to advanced
         if len(ifnames) == 0:
@@ -636,7 +684,7 @@ class TurnkeyConsole:
 
         if retcode is not self.OK:
             # if multiple interfaces go back to networking
-            if len(self._get_filtered_ifnames()) > 1:
+            if len(self.network.ifnames) > 1:
                 return "networking"
 
             return "advanced"
@@ -644,6 +692,9 @@ class TurnkeyConsole:
         return "_ifconf_" + choice.lower()
 
     def _ifconf_staticip(self) -> str:
+        import ipaddr
+        import netinfo
+
         log_msg = "Applying static ip"
         log.info(log_msg)
         def _validate(
@@ -814,14 +865,16 @@ class TurnkeyConsole:
             == self.OK
         ):
             self.console.infobox(f"Requesting DHCP for {self.ifname}...")
-            err = ifutil.set_dhcp(self.ifname)
+            err = ifutil.set_dhcp(
+                self.ifname, conf.get_conf().dhcp_timeout
+            )
             if err:
                 self.console.msgbox("Error", err)
 
         return "ifconf"
 
     def _ifconf_default(self) -> str:
-        conf.Conf().set_default_nic(self.ifname)
+        conf.get_conf().set_default_nic(self.ifname)
         return "ifconf"
 
     def _adv_install(self) -> str:
@@ -871,7 +924,14 @@ class TurnkeyConsole:
         standalone = dialog != "usage"  # no "back" for plugins
 
         while dialog and self.running:
+            # each screen probes the network (at most) once
+            self._network = None
             try:
+                changed = self.pluginManager.poll_changes()
+                if self.worker:
+                    if changed:
+                        self.worker.stop()  # forked from the old tree
+                    self.worker.prefork()
                 if not dialog.startswith(PLUGIN_PATH):
                     try:
                         method = getattr(self, dialog)
@@ -880,12 +940,17 @@ class TurnkeyConsole:
                             f"dialog not supported: {dialog}"
                         )
                 else:
+                    self.pluginManager.wait()
                     try:
-                        method = self.pluginManager.path_map[dialog].run
+                        p = self.pluginManager.path_map[dialog]
                     except KeyError:
                         raise ConfconsoleError(
                             f"could not find plugin dialog: {dialog}"
                         )
+                    if self.worker and isinstance(p, plugin.Plugin):
+                        method = partial(self.worker.run, p)
+                    else:
+                        method = p.run
 
                 new_dialog = method()
                 if standalone:  # XXX This feels dirty
@@ -894,6 +959,9 @@ class TurnkeyConsole:
                 dialog = new_dialog
 
             except Exception:  # TODO should only catch specific errors
+                import traceback
+                from io import StringIO
+
                 sio = StringIO()
                 traceback.print_exc(file=sio)
 
@@ -901,16 +969,52 @@ class TurnkeyConsole:
                 dialog = prev_dialog
 
 
+def read_manifest(path: str) -> list[str]:
+    """Read plugin names from a manifest file (one per line, blank lines and
+    lines starting with # ignored)"""
+    names = []
+    try:
+        with open(path) as fob:
+            for line in fob:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    names.append(line)
+    except OSError as e:
+        fatal(f"failed to read manifest {path}: {e}")
+    return names
+
+
+def get_plugin(pm: plugin.PluginManager, name: str) -> plugin.Plugin:
+    ps = [p for p in pm.getByName(name) if isinstance(p, plugin.Plugin)]
+
+    if len(ps) > 1:
+        fatal(f"plugin name ambiguous, matches all of {ps}")
+    elif len(ps) == 0:
+        fatal(f"no such plugin: {name}")
+    return ps[0]
+
+
 def main() -> None:
     interactive = True
     advanced_enabled = True
     plugin_name = None
+    batch_names: list[str] = []
+
+    setup_logging()
 
     if os.geteuid() != 0:
         fatal("confconsole needs root privileges to run")
 
     try:
-        l_opts = ["help", "usage", "nointeractive", "plugin="]
+        l_opts = [
+            "help",
+            "usage",
+            "nointeractive",
+            "plugin=",
+            "plugins=",
+            "manifest=",
+            "profile-startup",
+        ]
         opts, _ = getopt.gnu_getopt(sys.argv[1:], "hn", l_opts)
     except getopt.GetoptError as e:
         usage(e)
@@ -924,43 +1028,120 @@ def main() -> None:
             interactive = False
         elif opt == "--plugin":
             plugin_name = val
+        elif opt == "--plugins":
+            batch_names.extend(name for name in val.split(",") if name)
+        elif opt == "--manifest":
+            batch_names.extend(read_manifest(val))
+        elif opt == "--profile-startup":
+            profiler.start()
         else:
             usage()
 
-    em = plugin.EventManager()
+    if plugin_name and batch_names:
+        usage("--plugin can not be combined with --plugins or --manifest")
+    run_direct = bool(plugin_name or batch_names)
+
+    config = conf.get_conf()
+    em = plugin.EventManager(
+        async_dispatch=config.async_events,
+        handler_timeout=config.event_timeout,
+    )
     pm = plugin.PluginManager(
-        PLUGIN_PATH, {"eventManager": em, "interactive": interactive}
+        PLUGIN_PATH,
+        {"eventManager": em, "interactive": interactive},
+        lazy=True,
+        index=PLUGIN_INDEX,
+        # nothing to hide loading behind when running a plugin directly
+        background=not run_direct and config.background_plugins,
+        # when running a plugin directly, only that plugin (and any plugins
+        # it depends on or imports) is loaded and initialised
+        eager_init=not run_direct,
+        overlays=PLUGIN_OVERLAYS,
     )
 
-    if plugin_name:
-        ps = list(
-            filter(
-                lambda x: isinstance(x, plugin.Plugin),
-                pm.getByName(plugin_name),
-            )
-        )
-
-        if len(ps) > 1:
-            fatal(f"plugin name ambiguous, matches all of {ps}")
-        elif len(ps) == 1:
-            p = ps[0]
+    try:
+        if plugin_name:
+            p = get_plugin(pm, plugin_name)
 
             if interactive:
-                tc = TurnkeyConsole(pm, em, advanced_enabled)
+                with profiler.measure("init", "TurnkeyConsole"):
+                    tc = TurnkeyConsole(pm, em, advanced_enabled)
                 tc.loop(dialog=p.path)  # calls .run()
             else:
-                assert isinstance(p, plugin.Plugin)
+                p.init()
                 p.module.run()
+        elif batch_names:
+            ps = [get_plugin(pm, name) for name in batch_names]
+
+            if interactive:
+                # a single UI can't be shared; run plugins one after another
+                with profiler.measure("init", "TurnkeyConsole"):
+                    tc = TurnkeyConsole(pm, em, advanced_enabled)
+                for p in ps:
+                    tc.loop(dialog=p.path)  # calls .run()
+            else:
+                failed = False
+                results = plugin.run_batch(ps)
+                for p in ps:
+                    error = results[p.path]
+                    if error is None:
+                        log.info(f"plugin {p.module_name}: ok")
+                    else:
+                        failed = True
+                        msg = f"plugin {p.module_name} failed: {error}"
+                        log.error(msg, exc_info=error)
+                        print(msg, file=sys.stderr)
+                if failed:
+                    sys.exit(1)
         else:
-            fatal("no such plugin")
-    else:
-        tc = TurnkeyConsole(pm, em, advanced_enabled)
-        tc.loop()
+            with profiler.measure("init", "TurnkeyConsole"):
+                tc = TurnkeyConsole(pm, em, advanced_enabled)
+            if config.watch_plugins:
+                try:
+                    pm.watch()
+                except inotify.InotifyError as e:
+                    log.warning(f"not watching plugins for changes: {e}")
+            # confconsole.conf is commonly replaced in several steps (e.g. by
+            # editors), so handle a burst of changes once
+            em.add_event(conf.CHANGED_EVENT, debounce=CONF_CHANGED_DEBOUNCE)
+            conf_watcher = conf.ConfWatcher(
+                partial(em.fire_event, conf.CHANGED_EVENT)
+            )
+            try:
+                conf_watcher.start()
+            except conf.ConfconsoleConfError as e:
+                log.warning(f"not watching configuration for changes: {e}")
+            bus = None
+            if config.event_bus:
+                from eventbus import EventBus, EventBusError
+
+                bus = EventBus(em)
+                try:
+                    bus.start()
+                except EventBusError as e:
+                    log.warning(f"not listening for external events: {e}")
+            try:
+                tc.loop()
+            finally:
+                if bus:
+                    bus.stop()
+                conf_watcher.stop()
+    finally:
+        # also on sys.exit (e.g. quitting with Esc); don't drop pending
+        # (debounced) events
+        em.flush()
+        em.log_stats()
+
+        if profiler.active:
+            # plugins may still be loading in the background
+            profiler.active.finish(force=True)
 
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
+        import traceback
+
         subprocess.run(["stty", "sane"])
         traceback.print_exc()
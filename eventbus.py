@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+# Copyright (c) 2026 TurnKey GNU/Linux <admin@turnkeylinux.org>
+# - all rights reserved
+"""Fire confconsole events from outside confconsole
+
+Sends each event to every running confconsole (which has the event bus
+enabled), where it is fired by its EventManager; i.e. handlers registered
+for the event by plugins are called. Events which no plugin handles are
+ignored. Exits successfully even if no confconsole is running.
+
+Usage: confconsole-event [-q] <event> [<event> ...]
+
+Options:
+    -q, --quiet  Don't print the number of consoles notified
+"""
+
+import os
+import re
+import sys
+import json
+import getopt
+import socket
+import logging
+import threading
+from typing import Any, NoReturn
+
+log = logging.getLogger(__name__)
+
+# each running console listens on a datagram socket in here
+SOCKET_DIR = "/run/confconsole/events"
+
+EVENT_RE = re.compile(r"^[\w.:-]{1,128}$")
+MAX_MESSAGE = 4096
+
+
+class EventBusError(Exception):
+    pass
+
+
+class EventBus:
+    """Local (Unix socket) bridge to an EventManager: events published (by
+    `publish`, e.g. via confconsole-event) are fired by `event_manager`, on
+    the event bus thread."""
+
+    def __init__(self, event_manager: Any, socket_dir: str = SOCKET_DIR):
+        self.event_manager = event_manager
+        self.socket_dir = socket_dir
+        self.path = os.path.join(socket_dir, f"{os.getpid()}.sock")
+        self._sock: socket.socket | None = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._sock is not None:
+            return
+        try:
+            os.makedirs(self.socket_dir, mode=0o700, exist_ok=True)
+            if os.path.exists(self.path):
+                os.remove(self.path)  # left by a previous process
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.path)
+            os.chmod(self.path, 0o600)
+        except OSError as e:
+            raise EventBusError(f"can't listen on {self.path}: {e}")
+        # so that stop() is noticed
+        sock.settimeout(0.5)
+        self._sock = sock
+        self._stop.clear()
+        threading.Thread(
+            target=self._serve, name="event-bus", daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        if self._sock is None:
+            return
+        self._stop.set()
+        self._sock.close()
+        self._sock = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _serve(self) -> None:
+        sock = self._sock
+        assert sock is not None
+        while not self._stop.is_set():
+            try:
+                data = sock.recv(MAX_MESSAGE)
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # closed
+            try:
+                event = json.loads(data)["event"]
+            except (ValueError, KeyError, TypeError):
+                log.warning(f"event bus: ignoring invalid message: {data!r}")
+                continue
+            if not isinstance(event, str) or not EVENT_RE.match(event):
+                log.warning(f"event bus: ignoring invalid event: {event!r}")
+                continue
+            log.info(f"event bus: firing {event}")
+            try:
+                self.event_manager.fire_event(event)
+            except Exception:
+                log.exception(f"event bus: firing {event} failed")
+
+
+def publish(event: str, socket_dir: str = SOCKET_DIR) -> int:
+    """Send event to each running console; returns the number notified.
+    Sockets left by consoles which are no longer running are removed, and
+    consoles which aren't keeping up with events (i.e. whose queue is
+    full) are skipped rather than waited for."""
+    if not EVENT_RE.match(event):
+        raise EventBusError(f"invalid event name: {event!r}")
+    message = json.dumps({"event": event}).encode()
+
+    try:
+        names = os.listdir(socket_dir)
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        raise EventBusError(f"can't list consoles in {socket_dir}: {e}")
+
+    sent = 0
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        for name in names:
+            if not name.endswith(".sock"):
+                continue
+            path = os.path.join(socket_dir, name)
+            try:
+                sock.sendto(message, path)
+                sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                log.warning(f"event bus: {path} is busy, skipped {event}")
+            except OSError as e:
+                raise EventBusError(f"sending to {path} failed: {e}")
+    return sent
+
+
+def usage(msg: str = "") -> NoReturn:
+    if msg:
+        print(f"Error: {msg}", file=sys.stderr)
+    print(__doc__.strip(), file=sys.stderr)
+    sys.exit(1)
+
+
+def main() -> None:
+    try:
+        opts, events = getopt.gnu_getopt(
+            sys.argv[1:], "hq", ["help", "quiet"]
+        )
+    except getopt.GetoptError as e:
+        usage(str(e))
+
+    quiet = False
+    for opt, _ in opts:
+        if opt in ("-h", "--help"):
+            usage()
+        elif opt in ("-q", "--quiet"):
+            quiet = True
+
+    if not events:
+        usage("no event given")
+
+    try:
+        for event in events:
+            sent = publish(event)
+            if not quiet:
+                print(f"{event}: sent to {sent} console(s)")
+    except EventBusError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
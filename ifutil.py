@@ -1,11 +1,29 @@
 import os
 import re
+import select
+import logging
+import threading
 import subprocess
-from dataclasses import dataclass
-from time import sleep
+from dataclasses import dataclass, field
+from time import monotonic, sleep
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
 
-from netinfo import InterfaceInfo
-from netinfo import get_hostname
+if TYPE_CHECKING:
+    import rtnetlink
+
+log = logging.getLogger(__name__)
+
+# seconds to wait for a DHCP lease (by default)
+DHCP_TIMEOUT = 60
+
+# seconds to wait for a static address to be configured (by ifup)
+STATIC_TIMEOUT = 5
+
+# dhclient (run by ifup) output when it isn't going to get a lease
+DHCP_FAILURES = ("DHCPNAK", "No DHCPOFFERS received", "No working leases")
+
+# NOTE: netinfo and rtnetlink are imported where used so that importing this
+# module (e.g. at confconsole start up) doesn't import them
 
 
 class IfError(Exception):
@@ -34,6 +52,8 @@ IPV4_CIDR = r"^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})/(\d{1,2})(.*)$"
 
 def _preprocess_interface_config(config: str) -> list[str]:
     """Process and Validate Networking Interface"""
+    from netinfo import get_hostname
+
     lines = config.splitlines()
     new_lines = []
     hostname = get_hostname()
@@ -107,16 +127,177 @@ class IPv4:
         return f"{self.p0}.{self.p1}.{self.p2}.{self.p3}"
 
 
+# stanzas which end an iface stanza (see interfaces(5))
+_STANZA_KEYWORDS = (
+    "iface",
+    "mapping",
+    "auto",
+    "source",
+    "source-directory",
+    "rename",
+    "no-auto-down",
+    "no-scripts",
+)
+
+# names of files read from a source-directory (as run-parts)
+_SOURCE_DIRECTORY_RE = re.compile(r"^[a-zA-Z0-9_-]+$")
+
+
+@dataclass
+class Stanza:
+    """An iface stanza of /etc/network/interfaces (or a file it sources)"""
+
+    ifname: str
+    family: str
+    method: str
+    # file the stanza was read from
+    path: str
+    # option lines (stripped), in order
+    lines: list[str] = field(default_factory=list)
+    # option -> values of its first occurrence
+    options: dict[str, list[str]] = field(default_factory=dict)
+
+
+@dataclass
+class _InterfacesFile:
+    # as NetworkInterfaces.conf and .includes
+    conf: dict[str, list[str]]
+    includes: list[str]
+    unconfigured: bool
+    stanzas: list[Stanza]
+    # (source or source-directory, argument)
+    sources: list[tuple[str, str]]
+
+
+def _logical_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Yield non-blank, non-comment lines, joining continued lines"""
+    pending = ""
+    for line in lines:
+        line = line.rstrip()
+        if line.endswith("\\"):
+            pending += line[:-1] + " "
+            continue
+        line = (pending + line).strip()
+        pending = ""
+        if line and not line.startswith("#"):
+            yield line
+
+
+def _parse_stanzas(
+    lines: Iterable[str], path: str
+) -> tuple[list[Stanza], list[tuple[str, str]]]:
+    """Return the iface stanzas and source(-directory) directives in lines"""
+    stanzas: list[Stanza] = []
+    sources = []
+    stanza = None
+    for line in _logical_lines(lines):
+        words = line.split()
+        keyword = words[0]
+        if keyword in _STANZA_KEYWORDS or keyword.startswith("allow-"):
+            stanza = None
+            if keyword == "iface" and len(words) >= 4:
+                stanza = Stanza(words[1], words[2], words[3], path)
+                stanzas.append(stanza)
+            elif keyword in ("source", "source-directory") and len(words) > 1:
+                sources.append((keyword, words[1]))
+        elif stanza is not None:
+            stanza.lines.append(line)
+            stanza.options.setdefault(keyword, words[1:])
+    return stanzas, sources
+
+
+def _read_interfaces_file(path: str) -> _InterfacesFile:
+    conf: dict[str, list[str]] = {}
+    includes = []
+    unconfigured = False
+    ifname: str | None = None
+
+    with open(path) as fob:
+        lines = fob.readlines()
+
+    for line in lines:
+        line = line.rstrip()
+
+        if line == NetworkInterfaces.HEADER_UNCONFIGURED:
+            unconfigured = True
+
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("auto") or line.startswith("allow-hotplug"):
+            ifname = line.split()[1]
+            conf[ifname] = [line]
+        elif ifname:
+            conf[ifname].append(line)
+        elif line.startswith("source"):
+            includes.append(line)
+
+    stanzas, sources = _parse_stanzas(lines, path)
+    return _InterfacesFile(conf, includes, unconfigured, stanzas, sources)
+
+
+# path -> ((mtime, size, inode), parsed file)
+_interfaces_cache: dict[
+    str, tuple[tuple[int, int, int], _InterfacesFile]
+] = {}
+
+
+def _get_interfaces_file(path: str) -> _InterfacesFile:
+    """Return the parsed file; only re-read when it has changed (i.e. its
+    mtime, size or inode)"""
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _interfaces_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    parsed = _read_interfaces_file(path)
+    _interfaces_cache[path] = (key, parsed)
+    return parsed
+
+
+def _sourced_paths(path: str, sources: list[tuple[str, str]]) -> list[str]:
+    """Return the files sourced (in order) by the file at path"""
+    import glob
+
+    paths = []
+    base = os.path.dirname(path)
+    for keyword, arg in sources:
+        arg = os.path.join(base, arg)
+        if keyword == "source":
+            paths.extend(sorted(glob.glob(arg)))
+        else:
+            try:
+                names = sorted(os.listdir(arg))
+            except OSError:
+                continue
+            paths.extend(
+                os.path.join(arg, name)
+                for name in names
+                if _SOURCE_DIRECTORY_RE.match(name)
+            )
+    return paths
+
+
 class NetworkInterfaces:
+    """/etc/network/interfaces
+
+    `conf` holds the interfaces' lines (as written by `write`), grouped by
+    the auto/allow-hotplug line they follow. Options are looked up in the
+    iface stanzas of the file and the files it sources (see `stanzas`).
+    Files are only parsed when they have changed.
+    """
+
     HEADER_UNCONFIGURED = "# UNCONFIGURED INTERFACES"
     CONF_FILE = "/etc/network/interfaces"
 
     conf: dict[str, list[str]] = {}
+    # source(-directory) lines preceding the interfaces
+    includes: list[str] = []
     unconfigured: bool = True
 
-    _iface_opts = ["pre-up", "up", "post-up", "pre-down", "down", "post-down"]
+    _iface_opts = {"pre-up", "up", "post-up", "pre-down", "down", "post-down"}
 
-    _bridge_opts = [
+    _bridge_opts = {
         "bridge_ports",
         "bridge_ageing",
         "bridge_bridgeprio",
@@ -130,15 +311,60 @@ class NetworkInterfaces:
         "bridge_portprio",
         "bridge_stp",
         "bridge_waitport",
-    ]
-
-    def _get_opts_subset(self, ifname: str, opts: list[str]) -> list[str]:
+    }
+
+    def __init__(self) -> None:
+        # stanzas of sourced files
+        self._sourced: list[Stanza] = []
+        # built from conf and _sourced when needed; see `stanzas`
+        self._stanzas: dict[str, list[Stanza]] | None = None
+        self._options: dict[str, dict[str, list[str]]] | None = None
+
+    def _index(self, stanzas: Iterable[Stanza]) -> None:
+        self._stanzas = {}
+        self._options = {}
+        for stanza in stanzas:
+            self._stanzas.setdefault(stanza.ifname, []).append(stanza)
+            if stanza.ifname not in self._options:
+                self._options[stanza.ifname] = {
+                    "iface": [stanza.ifname, stanza.family, stanza.method]
+                }
+            options = self._options[stanza.ifname]
+            for key, values in stanza.options.items():
+                options.setdefault(key, values)
+
+    def _reindex(self) -> None:
+        # after conf has been changed
+        lines = [line for block in self.conf.values() for line in block]
+        stanzas, _ = _parse_stanzas(lines, self.CONF_FILE)
+        self._index([*stanzas, *self._sourced])
+
+    def _set_conf(self, ifname: str, lines: list[str]) -> None:
+        self.conf[ifname] = lines
+        self._stanzas = self._options = None
+
+    @property
+    def stanzas(self) -> dict[str, list[Stanza]]:
+        """ifname -> its iface stanzas (e.g. inet and inet6)"""
+        if self._stanzas is None:
+            self._reindex()
+        assert self._stanzas is not None
+        return self._stanzas
+
+    def _get_options(self, ifname: str) -> dict[str, list[str]]:
+        if self._options is None:
+            self._reindex()
+        assert self._options is not None
+        return self._options.get(ifname, {})
+
+    def _get_opts_subset(self, ifname: str, opts: set[str]) -> list[str]:
         if ifname not in self.conf:
             raise InterfaceNotFoundError(f"no existing config for {ifname}")
         return [
-            line.strip()
-            for line in self.conf[ifname]
-            if line.strip().split()[0] in opts
+            line
+            for stanza in self.stanzas.get(ifname, [])
+            for line in stanza.lines
+            if line.split()[0] in opts
         ]
 
     def get_iface_opts(self, ifname: str) -> list[str]:
@@ -150,33 +376,36 @@ class NetworkInterfaces:
     def duplicate(self) -> "NetworkInterfaces":
         interfaces = NetworkInterfaces()
         interfaces.unconfigured = self.unconfigured
+        interfaces.includes = list(self.includes)
         interfaces.conf = {
             key: [i for i in value] for key, value in self.conf.items()
         }
+        interfaces._sourced = self._sourced
         return interfaces
 
     def read(self) -> None:
-        # clear config
-        self.conf = {}
-        self.unconfigured = False
-
-        ifname: str | None = None
-
-        with open(self.CONF_FILE) as fob:
-            for line in fob:
-                line = line.rstrip()
-
-                if line == self.HEADER_UNCONFIGURED:
-                    self.unconfigured = True
-
-                if not line or line.startswith("#"):
-                    continue
+        parsed = _get_interfaces_file(self.CONF_FILE)
+        self.conf = {key: list(value) for key, value in parsed.conf.items()}
+        self.includes = list(parsed.includes)
+        self.unconfigured = parsed.unconfigured
+
+        # files sourced (recursively) by CONF_FILE
+        self._sourced = []
+        seen = {os.path.realpath(self.CONF_FILE)}
+        pending = _sourced_paths(self.CONF_FILE, parsed.sources)
+        while pending:
+            path = pending.pop(0)
+            if os.path.realpath(path) in seen:
+                continue
+            seen.add(os.path.realpath(path))
+            try:
+                sourced = _get_interfaces_file(path)
+            except OSError:
+                continue
+            self._sourced.extend(sourced.stanzas)
+            pending[:0] = _sourced_paths(path, sourced.sources)
 
-                if line.startswith("auto") or line.startswith("allow-hotplug"):
-                    ifname = line.split()[1]
-                    self.conf[ifname] = [line]
-                elif ifname:
-                    self.conf[ifname].append(line)
+        self._index([*parsed.stanzas, *self._sourced])
 
     def write(self) -> None:
         if not self.unconfigured:
@@ -185,17 +414,27 @@ class NetworkInterfaces:
                 f"header not found: {self.HEADER_UNCONFIGURED}"
             )
 
-        with open(self.CONF_FILE, "w") as fob:
-            fob.write(self.HEADER_UNCONFIGURED + "\n")
-            for iface in self.conf.keys():
-                fob.write("\n\n")
-                fob.write("\n".join(self.conf[iface]))
-                fob.write("\n")
+        try:
+            with open(self.CONF_FILE, "w") as fob:
+                fob.write(self.HEADER_UNCONFIGURED + "\n")
+                if self.includes:
+                    fob.write("\n" + "\n".join(self.includes) + "\n")
+                for iface in self.conf.keys():
+                    fob.write("\n\n")
+                    fob.write("\n".join(self.conf[iface]))
+                    fob.write("\n")
+        finally:
+            # the rewritten file may have the same size, inode and (within
+            # the timestamp granularity) mtime as the cached one
+            _interfaces_cache.pop(self.CONF_FILE, None)
 
     def gen_default_if_config(self, ifname: str) -> None:
         if ifname.startswith("e"):
-            self.conf[ifname] = _preprocess_interface_config(
-                f"auto {ifname}\niface {ifname} inet dhcp"
+            self._set_conf(
+                ifname,
+                _preprocess_interface_config(
+                    f"auto {ifname}\niface {ifname} inet dhcp"
+                ),
             )
         else:
             raise InterfaceNotFoundError(f"no existing config for {ifname}")
@@ -206,7 +445,7 @@ class NetworkInterfaces:
 
         ifconf = _preprocess_interface_config("\n".join(self.conf[ifname]))
         ifconf[1] = f"iface {ifname} inet dhcp"
-        self.conf[ifname] = ifconf
+        self._set_conf(ifname, ifconf)
 
         self.write()
 
@@ -216,7 +455,7 @@ class NetworkInterfaces:
 
         ifconf = _preprocess_interface_config("\n".join(self.conf[ifname]))
         ifconf[1] = f"iface {ifname} inet manual"
-        self.conf[ifname] = ifconf
+        self._set_conf(ifname, ifconf)
 
         self.write()
 
@@ -242,16 +481,14 @@ class NetworkInterfaces:
             joined_nameservers = " ".join(nameservers)
             ifconf.append(f"    dns-nameservers {joined_nameservers}")
 
-        self.conf[ifname] = ifconf
+        self._set_conf(ifname, ifconf)
         self.write()
 
     def get_if_conf(self, ifname: str, key: str) -> list[str] | None:
-        if ifname in self.conf:
-            for line in self.conf:
-                line_list = line.strip().split()
-                if line_list[0] == key:
-                    return line_list[1:]
-        return None
+        """Return the values of option `key` of ifname (i.e. its first
+        occurrence in ifname's iface stanzas); for "iface", [ifname,
+        family, method]"""
+        return self._get_options(ifname).get(key)
 
     def get_nameservers(self, ifname: str) -> list[str] | None:
         return self.get_if_conf(ifname, "dns-nameservers") or []
@@ -278,11 +515,12 @@ def _parse_resolv(path: str) -> list[str]:
     return nameservers
 
 
-def get_nameservers(ifname: str) -> list[str]:
+def _find_nameservers(
+    ifname: str,
+    interfaces: NetworkInterfaces,
+    parse_resolv: Callable[[str], list[str]] = _parse_resolv,
+) -> list[str]:
     # /etc/network/interfaces
-    interfaces = NetworkInterfaces()
-    interfaces.read()
-
     nameservers = interfaces.get_nameservers(ifname)
     if nameservers:
         return nameservers
@@ -294,12 +532,18 @@ def get_nameservers(ifname: str) -> list[str]:
             if not f.startswith(ifname) or f.endswith(".inet"):
                 continue
 
-            nameservers = _parse_resolv(os.path.join(path, f))
+            nameservers = parse_resolv(os.path.join(path, f))
             if nameservers:
                 return nameservers
 
     # /etc/resolv.conf (fallback)
-    return _parse_resolv("/etc/resolv.conf")
+    return parse_resolv("/etc/resolv.conf")
+
+
+def get_nameservers(ifname: str) -> list[str]:
+    interfaces = NetworkInterfaces()
+    interfaces.read()
+    return _find_nameservers(ifname, interfaces)
 
 
 def ifup(ifname: str, force: bool = False) -> str:
@@ -387,15 +631,13 @@ def set_static(
 
         try:
             interfaces.set_static(ifname, addr, netmask, gateway, nameservers)
-            sleep(0.5)
         except Exception as e:
             backup_interfaces.write()
             raise e
         finally:
             output = ifup(ifname, True)
 
-        net = InterfaceInfo(ifname)
-        if not net.address:
+        if not wait_for_address(ifname, monotonic() + STATIC_TIMEOUT):
             raise IfError(f"Error obtaining IP address\n\n{output}")
 
         return None
@@ -403,7 +645,127 @@ def set_static(
         return str(e)
 
 
-def set_dhcp(ifname: str) -> str | None:
+def _ifup_dhcp(
+    ifname: str, deadline: float
+) -> tuple[str | None, str, str | None]:
+    """Bring up ifname (as `ifup(ifname, True)`) and wait until it has an
+    IPv4 address, the DHCP client reports that it can't get a lease or
+    `deadline` (time.monotonic()) passes, or ifup finishes without an
+    address. Returns (address, ifup output, failure); on failure (or
+    timeout) ifup and the DHCP client are killed."""
+    import socket
+    import rtnetlink
+
+    def get_address() -> str | None:
+        try:
+            return _get_address(ifname, socket.AF_INET)
+        except rtnetlink.RtnetlinkError:
+            from netinfo import InterfaceInfo
+
+            return InterfaceInfo(ifname).address
+
+    try:
+        rtnl: rtnetlink.Rtnetlink | None = rtnetlink.Rtnetlink(
+            rtnetlink.RTMGRP_IPV4_IFADDR
+        )
+    except rtnetlink.RtnetlinkError:
+        rtnl = None  # poll instead
+
+    proc = subprocess.Popen(
+        ["/usr/sbin/ifup", "--force", "--ignore-errors", ifname],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        # so that the DHCP client it starts can be killed along with it
+        start_new_session=True,
+    )
+    stderr = proc.stderr
+    exited = False
+    output = b""
+    address = None
+    failure = None
+    try:
+        while address is None and failure is None:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                failure = "no DHCP lease obtained in time"
+                break
+            readable = [fob for fob in (stderr, rtnl) if fob is not None]
+            ready = select.select(
+                readable, [], [], remaining if rtnl else min(remaining, 0.1)
+            )[0]
+
+            recheck = rtnl is None
+            if stderr is not None and stderr in ready:
+                data = os.read(stderr.fileno(), 4096)
+                if data:
+                    output += data
+                    for message in DHCP_FAILURES:
+                        if message.encode() in output:
+                            failure = f"DHCP client reported: {message}"
+                else:
+                    stderr = None  # ifup has finished
+                    recheck = True
+                    exited = True
+            if rtnl is not None and rtnl in ready:
+                if any(
+                    msg_type
+                    in (rtnetlink.RTM_NEWADDR, rtnetlink.NLMSG_OVERRUN)
+                    for msg_type, _ in rtnl.read()
+                ):
+                    recheck = True
+            if recheck and failure is None:
+                address = get_address()
+                if address is None and exited:
+                    failure = "ifup finished without obtaining a DHCP lease"
+    finally:
+        if rtnl is not None:
+            rtnl.close()
+        if address is None:
+            _kill_ifup(proc, ifname)
+        elif proc.poll() is None:
+            # ifup may not have finished (e.g. running post-up commands);
+            # don't wait for it, but don't leave it blocked on its output
+            threading.Thread(
+                target=_reap, args=(proc, ifname), daemon=True
+            ).start()
+        elif proc.stderr is not None:
+            proc.stderr.close()
+    return address, output.decode(errors="replace"), failure
+
+
+def _kill_ifup(proc: subprocess.Popen, ifname: str) -> None:
+    """Kill ifup and the DHCP client it started, and deconfigure ifname"""
+    import signal
+
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+    if proc.stderr is not None:
+        proc.stderr.close()
+    # a DHCP client which has already daemonised has left ifup's session
+    try:
+        ifdown(ifname, True)
+    except BadIfConfigError as e:
+        log.warning(f"dhcp {ifname}: {e}")
+
+
+def _reap(proc: subprocess.Popen, ifname: str) -> None:
+    """Drain the output of (and wait for) an ifup which is still running"""
+    if proc.stderr is not None:
+        with proc.stderr:
+            while proc.stderr.read(4096):
+                pass
+    log.info(f"ifup {ifname} exited with {proc.wait()}")
+
+
+def set_dhcp(ifname: str, timeout: float = DHCP_TIMEOUT) -> str | None:
+    """Configure ifname to use DHCP and bring it up; returns an error
+    message, or None once a lease has been obtained. Fails as soon as the
+    DHCP client reports that it can't get a lease (or ifup finishes
+    without one), or after `timeout` seconds."""
+    start = monotonic()
     try:
         ifdown(ifname, True)
 
@@ -414,38 +776,170 @@ def set_dhcp(ifname: str) -> str | None:
             interfaces.set_dhcp(ifname)
         except Exception as e:
             backup_interfaces.write()
+            ifup(ifname, True)
             raise e
-        finally:
-            output = ifup(ifname, True)
-        for _retry in range(10):
-            net = InterfaceInfo(ifname)
-            if net.address:
-                break
-            sleep(1)
-        if not net.address:
-            raise IfError(f"Error obtaining IP address\n\n{output}")
+
+        address, output, failure = _ifup_dhcp(ifname, start + timeout)
+        elapsed = monotonic() - start
+        if address is None:
+            log.warning(f"dhcp {ifname}: {failure} ({elapsed:.1f}s)")
+            raise IfError(
+                f"Error obtaining IP address: {failure} (after"
+                f" {elapsed:.1f}s)\n\n{output}"
+            )
+        log.info(f"dhcp {ifname}: {address} obtained in {elapsed:.1f}s")
         return None
     except Exception as e:
         return str(e)
 
 
+def _get_address(ifname: str, family: int) -> str | None:
+    """Return ifname's first usable (i.e. not tentative) address"""
+    import rtnetlink
+
+    link = rtnetlink.dump().get(ifname)
+    if link is None:
+        return None
+    for addr in link.get_addresses(family):
+        if not addr.flags & (
+            rtnetlink.IFA_F_TENTATIVE | rtnetlink.IFA_F_DADFAILED
+        ):
+            return addr.address
+    return None
+
+
+def wait_for_address(
+    ifname: str, deadline: float, family: int | None = None
+) -> str | None:
+    """Wait for ifname to have an address (IPv4 unless `family` is given)
+    until `deadline` (time.monotonic()); returns the address or None.
+
+    Sleeps on rtnetlink address notifications rather than polling (falling
+    back to polling every 0.1s if rtnetlink isn't available, or fails; IPv6
+    addresses are then read from /proc/net/if_inet6).
+    """
+    import socket
+    import rtnetlink
+
+    if family is None:
+        family = socket.AF_INET
+    groups = {
+        socket.AF_INET: rtnetlink.RTMGRP_IPV4_IFADDR,
+        socket.AF_INET6: rtnetlink.RTMGRP_IPV6_IFADDR,
+    }[family]
+
+    try:
+        # subscribe before checking, so that an address added in between
+        # isn't missed
+        with rtnetlink.Rtnetlink(groups) as rtnl:
+            return _wait_for_address(rtnl, ifname, deadline, family)
+    except rtnetlink.RtnetlinkError:
+        pass
+
+    while True:
+        if family == socket.AF_INET6:
+            address = _read_ipv6_address(ifname)
+        else:
+            from netinfo import InterfaceInfo
+
+            address = InterfaceInfo(ifname).address
+        if address or monotonic() >= deadline:
+            return address
+        sleep(min(0.1, max(deadline - monotonic(), 0)))
+
+
+def _read_ipv6_address(
+    ifname: str, path: str = "/proc/net/if_inet6"
+) -> str | None:
+    """Return ifname's first usable IPv6 address (cf. `_get_address`)"""
+    import socket
+    import rtnetlink
+
+    unusable = rtnetlink.IFA_F_TENTATIVE | rtnetlink.IFA_F_DADFAILED
+    try:
+        with open(path) as fob:
+            for line in fob:
+                # address, ifindex, prefixlen, scope, flags, ifname
+                fields = line.split()
+                if len(fields) != 6 or fields[5] != ifname:
+                    continue
+                if int(fields[4], 16) & unusable:
+                    continue
+                return socket.inet_ntop(
+                    socket.AF_INET6, bytes.fromhex(fields[0])
+                )
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _wait_for_address(
+    rtnl: "rtnetlink.Rtnetlink", ifname: str, deadline: float, family: int
+) -> str | None:
+    import rtnetlink
+
+    address = _get_address(ifname, family)
+    while address is None:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            break
+        # rather than following notifications (which may be for another
+        # interface or a tentative address, or have been lost), re-read
+        # addresses when one has been added
+        if any(
+            msg_type in (rtnetlink.RTM_NEWADDR, rtnetlink.NLMSG_OVERRUN)
+            for msg_type, _ in rtnl.read(remaining)
+        ):
+            address = _get_address(ifname, family)
+    return address
+
+
 def get_ipconf(
-    ifname: str, error: bool = False
+    ifname: str, error: bool = False, wait: float = 0
 ) -> tuple[str | None, str | None, str | None, list[str]]:
+    """Return (address, netmask, gateway, nameservers) of ifname, without
+    blocking (e.g. to render a screen). If ifname doesn't have an address,
+    wait up to `wait` seconds for one (see `wait_for_address`)."""
+    from netinfo import InterfaceInfo
+
     net = InterfaceInfo(ifname)
-    for _ in range(6):
-        net = InterfaceInfo(ifname)
-        if net.address is not None and net.netmask is not None:
-            gateway = net.get_gateway(error)
-            return (net.address, net.netmask, gateway, get_nameservers(ifname))
-        sleep(0.1)
+    if wait and (net.address is None or net.netmask is None):
+        if wait_for_address(ifname, monotonic() + wait):
+            net = InterfaceInfo(ifname)
+
+    if net.address is not None and net.netmask is not None:
+        gateway = net.get_gateway(error)
+        return (net.address, net.netmask, gateway, get_nameservers(ifname))
 
     # no interfaces up
     return (None, None, net.get_gateway(error), get_nameservers(ifname))
 
 
-def get_ipv6conf(ifname: str) -> tuple[str | None, str | None]:
-    """Get IPv6 global address and prefix for an interface."""
+def get_ipv6conf(
+    ifname: str, links: dict[str, "rtnetlink.Link"] | None = None
+) -> tuple[str | None, str | None]:
+    """Get IPv6 global address and prefix for an interface (from `links`,
+    i.e. rtnetlink.dump(), if given)."""
+    import socket
+    import rtnetlink
+
+    if links is None:
+        try:
+            links = rtnetlink.dump()
+        except rtnetlink.RtnetlinkError:
+            return _get_ipv6conf_ip(ifname)
+
+    link = links.get(ifname)
+    if link is not None:
+        for addr in link.get_addresses(
+            socket.AF_INET6, rtnetlink.RT_SCOPE_UNIVERSE
+        ):
+            return (addr.address, str(addr.prefixlen))
+    return (None, None)
+
+
+def _get_ipv6conf_ip(ifname: str) -> tuple[str | None, str | None]:
+    # fallback if rtnetlink isn't available
     try:
         out = subprocess.check_output(
             ["ip", "-6", "addr", "show", ifname, "scope", "global"],
@@ -463,10 +957,144 @@ def get_ipv6conf(ifname: str) -> tuple[str | None, str | None]:
     return (None, None)
 
 
-def get_ifmethod(ifname: str) -> str | None:
-    interfaces = NetworkInterfaces()
-    interfaces.read()
+def get_bridge_ports(bridge: str) -> list[str]:
+    """Return the names of the interfaces bridged by `bridge`"""
+    import rtnetlink
+
+    try:
+        return rtnetlink.get_ports(rtnetlink.dump(), bridge)
+    except rtnetlink.RtnetlinkError:
+        pass
+
+    # fallback if rtnetlink isn't available
+    lines = subprocess.run(
+        ["brctl", "show", bridge], capture_output=True, text=True
+    ).stdout.split("\n")
+    if len(lines) > 1 and lines[1].strip():
+        return [lines[1].split("\t")[-1]]
+    return []
+
+
+def _find_ifmethod(
+    ifname: str, interfaces: NetworkInterfaces
+) -> str | None:
     conf_line = interfaces.get_if_conf(ifname, "iface")
     if conf_line:
-        return conf_line[3]
+        return conf_line[2]
     return None
+
+
+def get_ifmethod(ifname: str) -> str | None:
+    interfaces = NetworkInterfaces()
+    interfaces.read()
+    return _find_ifmethod(ifname, interfaces)
+
+
+@dataclass
+class InterfaceConf:
+    ifname: str
+    address: str | None
+    netmask: str | None
+    gateway: str | None
+    nameservers: list[str]
+    method: str | None
+
+
+class NetworkSnapshot:
+    """Network configuration of the given interfaces, probed at most once
+    (per interface) however often it's used; i.e. for the life of a screen.
+
+    Interfaces are only probed when first used and /etc/network/interfaces
+    and resolver configuration are only read once.
+    """
+
+    def __init__(
+        self, ifnames: list[str], preferred_nic: str | None = None
+    ) -> None:
+        self.ifnames = ifnames
+        # i.e. default_nic from confconsole.conf
+        self.preferred_nic = preferred_nic
+        self._interfaces: NetworkInterfaces | None = None
+        self._resolv: dict[str, list[str]] = {}
+        self._ifconfs: dict[str, InterfaceConf] = {}
+        self._links: dict[str, "rtnetlink.Link"] | None = None
+        self._links_dumped = False
+        self._default_nic: str | None = None
+        self._default_nic_found = False
+
+    @property
+    def interfaces(self) -> NetworkInterfaces:
+        if self._interfaces is None:
+            interfaces = NetworkInterfaces()
+            interfaces.read()
+            self._interfaces = interfaces
+        return self._interfaces
+
+    def _parse_resolv(self, path: str) -> list[str]:
+        if path not in self._resolv:
+            self._resolv[path] = _parse_resolv(path)
+        return self._resolv[path]
+
+    def get_ipconf(self, ifname: str) -> InterfaceConf:
+        ifconf = self._ifconfs.get(ifname)
+        if ifconf is None:
+            from netinfo import InterfaceInfo
+
+            net = InterfaceInfo(ifname)
+            address, netmask = net.address, net.netmask
+            if address is None or netmask is None:
+                address = netmask = None
+            ifconf = InterfaceConf(
+                ifname,
+                address,
+                netmask,
+                net.get_gateway(False),
+                _find_nameservers(
+                    ifname, self.interfaces, self._parse_resolv
+                ),
+                _find_ifmethod(ifname, self.interfaces),
+            )
+            self._ifconfs[ifname] = ifconf
+        return ifconf
+
+    @property
+    def links(self) -> dict[str, "rtnetlink.Link"] | None:
+        """All links and their addresses (see rtnetlink.dump), or None if
+        rtnetlink isn't available"""
+        import rtnetlink
+
+        if not self._links_dumped:
+            try:
+                self._links = rtnetlink.dump()
+            except rtnetlink.RtnetlinkError:
+                self._links = None
+            self._links_dumped = True
+        return self._links
+
+    def get_ipv6conf(self, ifname: str) -> tuple[str | None, str | None]:
+        links = self.links
+        if links is None:
+            return _get_ipv6conf_ip(ifname)
+        return get_ipv6conf(ifname, links)
+
+    def _validip(self, ifname: str) -> bool:
+        ip = self.get_ipconf(ifname).address
+        if ip and not ip.startswith("169"):
+            return True
+        return self.get_ipv6conf(ifname)[0] is not None
+
+    @property
+    def default_nic(self) -> str | None:
+        """The preferred NIC if it has an address, otherwise the first
+        interface which does (or None)"""
+        if not self._default_nic_found:
+            candidates = self.ifnames
+            if self.preferred_nic:
+                candidates = [self.preferred_nic, *self.ifnames]
+            self._default_nic = None
+            for ifname in candidates:
+                if self._validip(ifname):
+                    self._default_nic = ifname
+                    break
+            self._default_nic_found = True
+        return self._default_nic
@@ -0,0 +1,129 @@
+# Copyright (c) 2026 TurnKey GNU/Linux <admin@turnkeylinux.org>
+# - all rights reserved
+"""Minimal inotify(7) interface (via ctypes, no external dependencies)"""
+
+import os
+import errno
+import select
+import struct
+from dataclasses import dataclass
+
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyError(Exception):
+    pass
+
+
+@dataclass
+class Event:
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+    # path of the watched directory (or file) `name` is relative to
+    watch_path: str
+
+    @property
+    def path(self) -> str:
+        if self.name:
+            return os.path.join(self.watch_path, self.name)
+        return self.watch_path
+
+
+class Inotify:
+    """Non-blocking inotify instance; add watches with `add_watch` then
+    collect events with `read` (e.g. once `fileno` is readable)"""
+
+    def __init__(self) -> None:
+        # ctypes is only imported here as it's slow to import
+        import ctypes
+
+        self._get_errno = ctypes.get_errno
+        try:
+            self._libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        except OSError as e:
+            raise InotifyError(f"inotify unavailable: {e}")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = self._get_errno()
+            raise InotifyError(f"inotify_init1 failed: {os.strerror(err)}")
+        self.watches: dict[int, str] = {}
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = self._get_errno()
+            raise InotifyError(
+                f"inotify_add_watch {path} failed: {os.strerror(err)}"
+            )
+        self.watches[wd] = path
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        if self.watches.pop(wd, None) is not None:
+            # fails (harmlessly) if the watch has already been removed by
+            # the kernel (e.g. the watched directory was deleted)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: float = 0) -> list[Event]:
+        """Return pending events, waiting up to `timeout` seconds for the
+        first one"""
+        if timeout and not select.select([self.fd], [], [], timeout)[0]:
+            return []
+
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            offset = 0
+            while offset < len(buf):
+                wd, mask, cookie, length = _EVENT.unpack_from(buf, offset)
+                offset += _EVENT.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                events.append(
+                    Event(
+                        wd,
+                        mask,
+                        cookie,
+                        os.fsdecode(name),
+                        self.watches.get(wd, ""),
+                    )
+                )
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            self.watches = {}
@@ -1,15 +1,27 @@
 #!/usr/bin/python
 import re
 import os
-import sys
+import ast
+import json
+import time
+import logging
+import builtins
+import weakref
+import threading
+import contextlib
 import importlib.util
-import importlib.abc
 from collections import OrderedDict
+from dataclasses import dataclass, asdict
 
 from types import ModuleType
-from typing import Callable, Any, Iterable
+from typing import Callable, Any, Iterable, Iterator
 import typing
 
+import inotify
+import profiler
+
+log = logging.getLogger(__name__)
+
 
 class PluginError(Exception):
     pass
@@ -19,6 +31,10 @@ class EventError(Exception):
     pass
 
 
+class EventTimeout(EventError):
+    pass
+
+
 class ModuleInterface(ModuleType):
     # this is a hack, we pretend all plugin modules are derived of this
     module_name: str
@@ -28,60 +44,723 @@ class ModuleInterface(ModuleType):
     def doOnce(self) -> None: ...
 
 
+@dataclass
+class HandlerResult:
+    """Outcome of one event handler call (see `EventResult`)"""
+
+    handler: Callable[[], None]
+    # seconds the handler may take (async dispatch only); None for no limit
+    timeout: float | None = None
+    error: BaseException | None = None
+    # set in async dispatch mode (concurrent.futures.Future)
+    future: Any = None
+    started: float = 0.0
+
+
+class EventResult:
+    """Returned by `EventManager.fire_event`. With async dispatch, handlers
+    may still be running; `wait` blocks until each has completed (or timed
+    out). Errors (including `EventTimeout`s) are in `errors`.
+
+    If the event is coalesced (see `EventManager.add_event`), handlers may
+    not have been called yet (`dispatched` is not set); all fires which are
+    coalesced into one handler call share the same result."""
+
+    def __init__(
+        self, event: str, handlers: list[HandlerResult] | None = None
+    ) -> None:
+        self.event = event
+        self.handlers: list[HandlerResult] = []
+        self._dispatched = threading.Event()
+        if handlers is not None:
+            self._set_handlers(handlers)
+
+    def _set_handlers(self, handlers: list[HandlerResult]) -> None:
+        self.handlers = handlers
+        self._dispatched.set()
+
+    @property
+    def dispatched(self) -> bool:
+        return self._dispatched.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self.dispatched and all(
+            h.future is None or h.future.done() for h in self.handlers
+        )
+
+    def wait(self) -> "EventResult":
+        from concurrent.futures import TimeoutError
+
+        self._dispatched.wait()
+        for result in self.handlers:
+            if result.future is None or result.error is not None:
+                continue
+            remaining = None
+            if result.timeout is not None:
+                elapsed = time.monotonic() - result.started
+                remaining = max(result.timeout - elapsed, 0)
+            try:
+                result.future.result(remaining)
+            except TimeoutError:
+                result.error = EventTimeout(
+                    f"handler {_handler_name(result.handler)} for event"
+                    f" '{self.event}' did not finish in {result.timeout:g}s"
+                )
+            except Exception as e:
+                result.error = e
+        return self
+
+    @property
+    def errors(self) -> list[BaseException]:
+        return [h.error for h in self.handlers if h.error is not None]
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+@dataclass
+class HandlerStats:
+    """Call counters of an event handler (see `EventManager.stats`)"""
+
+    calls: int = 0
+    errors: int = 0
+    # seconds
+    total_s: float = 0.0
+    max_s: float = 0.0
+
+    def add(self, duration: float, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.total_s += duration
+        self.max_s = max(self.max_s, duration)
+
+
+@dataclass
+class _Coalescing:
+    """Coalescing policy and state of an event"""
+
+    debounce: float | None
+    latest_wins: bool
+    # result of the next (coalesced) dispatch, shared by all pending fires
+    pending: EventResult | None = None
+    timer: threading.Timer | None = None
+    # incremented whenever the debounce timer is (re)started or cancelled
+    generation: int = 0
+    running: bool = False
+
+
+def _handler_name(handler: Callable[..., Any]) -> str:
+    module = getattr(handler, "__module__", None) or "?"
+    return f"{module}.{getattr(handler, '__qualname__', repr(handler))}"
+
+
 class EventManager:
     _handlers: dict[str, list[Callable[[], None]]]
     _events: set[str]
 
-    """ Object to handle event/handler interaction """
+    """ Object to handle event/handler interaction
 
-    def __init__(self) -> None:
+    By default handlers are called in order, on the thread which fires the
+    event. If `async_dispatch` is set, handlers are instead run on a thread
+    pool (of `max_workers`) and `fire_event` returns without waiting for
+    them. A handler's timeout (`add_handler`, else `handler_timeout`) is
+    then the time `EventResult.wait` will wait for it; a handler which
+    overruns is reported (but can't be stopped).
+
+    An event may be coalesced, so that a burst of fires results in a single
+    call of each handler; see `add_event`.
+
+    Calls, errors and durations of each handler are counted; see `stats`.
+
+    Handlers added whilst `registering` an owner (e.g. a plugin) are
+    recorded against it, so that they can be removed when it's reloaded;
+    see `remove_handlers`.
+    """
+
+    def __init__(
+        self,
+        async_dispatch: bool = False,
+        max_workers: int = 4,
+        handler_timeout: float | None = None,
+    ) -> None:
         self._handlers = {}
         self._events = set()
-
-    def add_event(self, event: str) -> Callable[[], None]:
-        """Adds event and returns callback function to `fire` event"""
+        self._initialisers: dict[
+            str, list[tuple[Any, Callable[[], None]]]
+        ] = {}
+        self._owned: dict[Any, list[tuple[str, Callable[[], None]]]] = {}
+        self._owner = threading.local()
+        self._timeouts: dict[Callable[[], None], float] = {}
+        self._coalescing: dict[str, _Coalescing] = {}
+        self._stats: dict[str, dict[str, HandlerStats]] = {}
+        self._lock = threading.Lock()
+        _renew_lock_after_fork(self)
+
+        self.async_dispatch = async_dispatch
+        self.handler_timeout = handler_timeout or None
+        self._pool = PluginTasks(max_workers, "event-handler")
+
+    def add_event(
+        self,
+        event: str,
+        debounce: float | None = None,
+        latest_wins: bool = False,
+    ) -> Callable[[], "EventResult"]:
+        """Adds event and returns callback function to `fire` event
+
+        If `debounce` (seconds) is given, handlers are only called once the
+        event hasn't been fired for that long (on a timer thread, or the
+        thread pool with async dispatch). If `latest_wins` is set, fires
+        whilst the event's handlers are running are collapsed into a single
+        call of the handlers once they have finished."""
         self._events.add(event)
         if event not in self._handlers:
             self._handlers[event] = []
+        if debounce or latest_wins:
+            self._coalescing[event] = _Coalescing(
+                debounce or None, latest_wins
+            )
 
-        def fire() -> None:
-            self.fire_event(event)
+        def fire() -> EventResult:
+            return self.fire_event(event)
 
         fire.__doc__ = f" Function to fire the `{event}` event "
         return fire
 
-    def add_handler(self, event: str, handler: Callable[[], None]) -> None:
-        """Adds a handler to an event"""
+    def add_handler(
+        self,
+        event: str,
+        handler: Callable[[], None],
+        timeout: float | None = None,
+    ) -> None:
+        """Adds a handler to an event; `timeout` (seconds) overrides the
+        default handler timeout for async dispatch"""
         if event not in self._handlers:
             self._events.add(event)
             self._handlers[event] = []
         self._handlers[event].append(handler)
+        if timeout is not None:
+            self._timeouts[handler] = timeout
+        owner = getattr(self._owner, "value", None)
+        if owner is not None:
+            self._owned.setdefault(owner, []).append((event, handler))
+
+    @contextlib.contextmanager
+    def registering(self, owner: Any) -> Iterator[None]:
+        """Record handlers added (on this thread) within the block as
+        `owner`'s"""
+        previous = getattr(self._owner, "value", None)
+        self._owner.value = owner
+        try:
+            yield
+        finally:
+            self._owner.value = previous
+
+    def remove_handlers(self, owner: Any) -> None:
+        """Remove all handlers added by `owner` (see `registering`); used
+        when a plugin is reloaded or removed"""
+        for event, handler in self._owned.pop(owner, []):
+            handlers = self._handlers.get(event, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not any(handler in h for h in self._handlers.values()):
+                self._timeouts.pop(handler, None)
+
+    def add_initialiser(
+        self, event: str, init: Callable[[], None], owner: Any = None
+    ) -> None:
+        """Adds a callback to be run (once) before `event` is first fired;
+        used to initialise plugins which handle said event on demand"""
+        self._initialisers.setdefault(event, []).append((owner, init))
+
+    def remove_initialisers(self, owner: Any) -> None:
+        """Remove the initialisers added for `owner` which haven't run yet;
+        used when a plugin is reloaded or removed"""
+        for event, initialisers in list(self._initialisers.items()):
+            initialisers = [i for i in initialisers if i[0] is not owner]
+            if initialisers:
+                self._initialisers[event] = initialisers
+            else:
+                del self._initialisers[event]
+
+    def fire_event(self, event: str) -> EventResult:
+        """Fire event, calling all handlers in order (or, with async
+        dispatch, submitting them to the thread pool)"""
+        for _, init in self._initialisers.pop(event, []):
+            # a plugin which fails to initialise mustn't fail the caller (or
+            # stop the other plugins from being initialised)
+            try:
+                init()
+            except Exception:
+                log.exception(
+                    f"Exception in initialiser {init!r} for event '{event}'"
+                )
 
-    def fire_event(self, event: str) -> None:
-        """Fire event, calling all handlers in order"""
         if event not in self._events:
-            return  # if event hasn't been registered, don't attempt to fire it
+            # if event hasn't been registered, don't attempt to fire it
+            return EventResult(event, [])
+
+        policy = self._coalescing.get(event)
+        if policy is None:
+            return self._dispatch(event, EventResult(event))
+
+        with self._lock:
+            if policy.pending is not None:
+                if policy.timer is not None:
+                    self._start_timer(event, policy)  # restart the window
+                return policy.pending
+            result = EventResult(event)
+            if policy.debounce:
+                policy.pending = result
+                self._start_timer(event, policy)
+                return result
+            if policy.running:
+                policy.pending = result
+                return result
+            policy.running = True
+        return self._dispatch(event, result, policy)
+
+    def flush(self, event: str | None = None) -> list[EventResult]:
+        """Call the handlers of (all, or the given) debounced events with
+        pending fires now, rather than at the end of the debounce window"""
+        flushed = []
+        for name, policy in list(self._coalescing.items()):
+            if event is not None and name != event:
+                continue
+            with self._lock:
+                if policy.timer is None:
+                    continue
+                policy.timer.cancel()
+                policy.timer = None
+                policy.generation += 1
+            result = self._run_pending(name, policy)
+            if result is not None:
+                flushed.append(result)
+        return flushed
+
+    def _start_timer(self, event: str, policy: _Coalescing) -> None:
+        if policy.timer is not None:
+            policy.timer.cancel()
+        policy.generation += 1
+        policy.timer = threading.Timer(
+            policy.debounce or 0,
+            self._debounced,
+            (event, policy, policy.generation),
+        )
+        policy.timer.daemon = True
+        policy.timer.start()
+
+    def _debounced(
+        self, event: str, policy: _Coalescing, generation: int
+    ) -> None:
+        with self._lock:
+            if generation != policy.generation:
+                return  # window was restarted (or flushed)
+            policy.timer = None
+        self._run_pending(event, policy)
+
+    def _run_pending(
+        self, event: str, policy: _Coalescing
+    ) -> EventResult | None:
+        with self._lock:
+            result = policy.pending
+            if result is None or policy.timer is not None:
+                return None
+            if policy.latest_wins and policy.running:
+                return None  # dispatched once the running handlers finish
+            policy.pending = None
+            policy.running = True
+        return self._dispatch(event, result, policy)
+
+    def _finished(self, event: str, policy: _Coalescing) -> None:
+        """Called when a coalesced event's handlers have all finished"""
+        with self._lock:
+            policy.running = False
+        self._run_pending(event, policy)
+
+    def _dispatch(
+        self,
+        event: str,
+        event_result: EventResult,
+        policy: _Coalescing | None = None,
+    ) -> EventResult:
+        results = []
+        for handler in list(self._handlers.get(event, [])):
+            result = HandlerResult(
+                handler, self._timeouts.get(handler, self.handler_timeout)
+            )
+            result.started = time.monotonic()
+            if self.async_dispatch:
+                result.future = self._pool.submit(
+                    self._call, event, handler, result.timeout
+                )
+            else:
+                try:
+                    # handler passed no arguments; can change if needed
+                    self._call(event, handler, result.timeout)
+                except Exception as e:
+                    result.error = e
+            results.append(result)
+        event_result._set_handlers(results)
+
+        if policy is not None:
+            futures = [r.future for r in results if r.future is not None]
+            if not futures:
+                self._finished(event, policy)
+            else:
+                remaining = [len(futures)]
+
+                def done(_: Any) -> None:
+                    with self._lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        self._finished(event, policy)
+
+                for future in futures:
+                    future.add_done_callback(done)
+        return event_result
+
+    def _call(
+        self, event: str, handler: Callable[[], None], timeout: float | None
+    ) -> None:
+        start = time.monotonic()
+        failed = False
+        try:
+            handler()
+        except Exception:
+            failed = True
+            log.exception(
+                f"Exception in handler {_handler_name(handler)} whilst"
+                f" handling event '{event}'"
+            )
+            raise
+        finally:
+            duration = time.monotonic() - start
+            with self._lock:
+                stats = self._stats.setdefault(event, {})
+                name = _handler_name(handler)
+                stats.setdefault(name, HandlerStats()).add(duration, failed)
+            if timeout is not None and duration > timeout:
+                log.warning(
+                    f"handler {_handler_name(handler)} for event '{event}'"
+                    f" took {duration:.2f}s (timeout {timeout:g}s)"
+                )
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Return call counters for each event (that has been handled):
+        {event: {"calls", "errors", "total_s", "max_s", "handlers":
+        {handler name: {"calls", "errors", "total_s", "max_s"}}}}; an
+        event's calls is the number of handler calls"""
+        with self._lock:
+            stats = {
+                event: {name: asdict(s) for name, s in handlers.items()}
+                for event, handlers in self._stats.items()
+            }
+
+        out = {}
+        for event, handlers in stats.items():
+            values = list(handlers.values())
+            out[event] = {
+                "calls": sum(h["calls"] for h in values),
+                "errors": sum(h["errors"] for h in values),
+                "total_s": sum(h["total_s"] for h in values),
+                "max_s": max(h["max_s"] for h in values),
+                "handlers": handlers,
+            }
+        return out
+
+    def log_stats(self) -> None:
+        """Log (e.g. to the journal, on exit) the counters of each handler,
+        as EVENT_* fields"""
+        for event, stats in self.stats().items():
+            for name, handler in stats["handlers"].items():
+                log.info(
+                    f"event {event} handler {name}: {handler['calls']} calls,"
+                    f" {handler['errors']} errors,"
+                    f" {handler['total_s']:.3f}s total,"
+                    f" {handler['max_s']:.3f}s max",
+                    extra={
+                        "EVENT_NAME": event,
+                        "EVENT_HANDLER": name,
+                        "EVENT_CALLS": handler["calls"],
+                        "EVENT_ERRORS": handler["errors"],
+                        "EVENT_TOTAL_S": round(handler["total_s"], 6),
+                        "EVENT_MAX_S": round(handler["max_s"], 6),
+                    },
+                )
 
-        if event not in self._handlers:
-            return  # if event has no handlers, don't attempt to fire it
 
-        for handler in self._handlers[event]:
+@dataclass
+class PluginMeta:
+    """Plugin metadata which can be determined without executing it"""
+
+    doc: str | None = None
+    has_run: bool = False
+    has_doOnce: bool = False
+    # deferred init declarations (None if not declared)
+    events: list[str] | None = None
+    depends: list[str] | None = None
+    # named locks held whilst run() runs in a batch (see `run_batch`)
+    locks: list[str] | None = None
+    # seconds run() may take in an isolated worker (see pluginworker)
+    timeout: float | None = None
+
+
+def read_metadata(path: str) -> PluginMeta:
+    """Read docstring, top level names and declarations from plugin source
+    without executing it"""
+    with open(path, "rb") as fob:
+        tree = ast.parse(fob.read(), path)
+
+    names = _toplevel_names(tree.body)
+    return PluginMeta(
+        doc=ast.get_docstring(tree, clean=False),
+        has_run="run" in names,
+        has_doOnce="doOnce" in names,
+        events=_read_declaration(tree.body, "PLUGIN_EVENTS"),
+        depends=_read_declaration(tree.body, "PLUGIN_DEPENDS"),
+        locks=_read_declaration(tree.body, "PLUGIN_LOCKS"),
+        timeout=_read_timeout(tree.body),
+    )
+
+
+def _read_declaration(body: list[ast.stmt], name: str) -> list[str] | None:
+    """Return the value of a module level `name = [...]` declaration (which
+    must be a literal list of strings) or None if not declared"""
+    value = _read_literal(body, name)
+    if value is None:
+        return None
+    try:
+        return [str(v) for v in value]
+    except TypeError:
+        raise PluginError(f"{name} must be a literal list of strings")
+
+
+def _read_timeout(body: list[ast.stmt]) -> float | None:
+    value = _read_literal(body, "PLUGIN_TIMEOUT")
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise PluginError("PLUGIN_TIMEOUT must be a literal number")
+    return float(value)
+
+
+def _read_literal(body: list[ast.stmt], name: str) -> Any:
+    """Return the (literal) value of module level `name` or None if not
+    assigned"""
+    value = None
+    for node in body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        if any(isinstance(t, ast.Name) and t.id == name for t in targets):
+            assert node.value is not None
             try:
-                handler()  # handler passed no arguments; can change if needed
-            except:  # TODO don't use bare except!
-                sys.stderr.write(
-                    "An Exception has occured within an event handler whilst"
-                    " attempting to handle event '{event}'\n{format_exc()}"
+                value = ast.literal_eval(node.value)
+            except ValueError:
+                raise PluginError(f"{name} must be a literal value")
+    return value
+
+
+class PluginCache:
+    """Thread safe key/value cache shared by all plugins (`context.cache`)"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        _renew_lock_after_fork(self)
+        self._values: dict[str, Any] = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._values.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def get_or_set(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Return cached value of `key`, calling `factory` to set it if not
+        yet cached"""
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = factory()
+            return self._values[key]
+
+    def invalidate(self, key: str | None = None) -> None:
+        """Remove `key` (or everything if not given) from the cache"""
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+
+
+class PluginTasks:
+    """Background task runner shared by all plugins (`context.tasks`); the
+    thread pool is only created when first used (and re-created in a forked
+    child, as its threads don't survive fork)"""
+
+    def __init__(
+        self, max_workers: int = 4, thread_name_prefix: str = "plugin-task"
+    ) -> None:
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._pool: Any = None
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any):
+        """Run `func(*args, **kwargs)` in the background; returns a
+        concurrent.futures.Future"""
+        with self._lock:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._pool = ThreadPoolExecutor(
+                    self.max_workers,
+                    thread_name_prefix=self.thread_name_prefix,
                 )
+                ref = weakref.ref(self)
+                os.register_at_fork(after_in_child=lambda: _forget(ref))
+        return self._pool.submit(func, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait)
+                self._pool = None
+
+
+def _forget(ref: "weakref.ref[PluginTasks]") -> None:
+    tasks = ref()
+    if tasks is not None:
+        tasks._pool = None
+        tasks._lock = threading.Lock()
+
+
+def _renew_lock_after_fork(obj: Any) -> None:
+    """Give obj a new `_lock` in forked children, as it may be held by a
+    thread (which doesn't exist in the child) at fork"""
+    ref = weakref.ref(obj)
+
+    def renew() -> None:
+        obj = ref()
+        if obj is not None:
+            obj._lock = threading.Lock()
+
+    os.register_at_fork(after_in_child=renew)
+
+
+class PluginContext:
+    """Shared state exposed to all plugins
+
+    Names set on the context (console, eventManager, interactive, impByName,
+    impByDir, impByPath, ...) are visible to every plugin as if they were
+    builtins; the context's namespace is used as each plugin module's
+    `__builtins__`. So adding a name, or replacing e.g. the console, is a
+    single update, regardless of the number of plugins (loaded or not).
+
+    The context itself is available to plugins as `context`; it also
+    provides a shared `cache` and background `tasks`. `version` is bumped
+    each time the context is updated.
+    """
+
+    # version of the context interface
+    API_VERSION = 1
+
+    def __init__(self, names: dict[str, Any] | None = None) -> None:
+        namespace = dict(builtins.__dict__)
+        namespace["context"] = self
+        object.__setattr__(self, "namespace", namespace)
+        object.__setattr__(self, "version", 0)
+        object.__setattr__(self, "cache", PluginCache())
+        object.__setattr__(self, "tasks", PluginTasks())
+        if names:
+            self.update(names)
+
+    def update(self, names: dict[str, Any]) -> None:
+        self.namespace.update(names)
+        object.__setattr__(self, "version", self.version + 1)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.namespace.get(name, default)
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.namespace[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        self.update({name: value})
+
+
+# inotify events which may require a plugin (or PluginDir) to be re-read
+WATCH_MASK = (
+    inotify.IN_ATTRIB  # e.g. made executable
+    | inotify.IN_CLOSE_WRITE
+    | inotify.IN_MOVED_FROM
+    | inotify.IN_MOVED_TO
+    | inotify.IN_CREATE
+    | inotify.IN_DELETE
+)
+
+# serialises plugin loading and init, which may be triggered from the plugin
+# loader, the UI, by firing an event or from a batch run
+_init_lock = threading.RLock()
+
+
+def _renew_init_lock() -> None:
+    global _init_lock
+    _init_lock = threading.RLock()
+
+
+# a thread (which doesn't exist in the child) may hold it at fork, e.g. when
+# the plugin worker is forked
+os.register_at_fork(after_in_child=_renew_init_lock)
 
 
 class Plugin:
-    """Object that holds various information about a `plugin`"""
+    """Object that holds various information about a `plugin`
 
-    parent: str | None
+    If `lazy` is set, the plugin source is only parsed (not executed) at
+    construction time; the module docstring and the presence of `run` and
+    `doOnce` are read from the AST. The module itself is executed the first
+    time it is needed (i.e. on first access of `module`). Previously read
+    metadata (e.g. from a `PluginIndex`) may be passed as `meta` to avoid
+    parsing the source.
+
+    Shared names (console, eventManager, etc) are provided by `context`;
+    see `PluginContext`.
+
+    `path` is the plugin's path within the (merged) plugin tree; `source`
+    is the file it's actually read from, if different (see
+    `PluginManager`).
+
+    A plugin which declares `PLUGIN_EVENTS` and/or `PLUGIN_DEPENDS` is
+    `deferred`; rather than being initialised at start up, its `doOnce` is
+    run by `init` when first needed (see `PluginManager`).
+    """
 
-    def __init__(self, path: str) -> None:
+    parent: str | None
+    dependencies: list["Plugin"]
+
+    def __init__(
+        self,
+        path: str,
+        lazy: bool = False,
+        meta: PluginMeta | None = None,
+        context: PluginContext | None = None,
+        source: str | None = None,
+    ) -> None:
         self.path = path
+        self.source = source or path
+        self.context = context or PluginContext()
         # for weighted ordering
         self.real_name = os.path.basename(path)
         # for menu entry
@@ -90,38 +769,176 @@ class Plugin:
         self.parent = None
 
         # used for imp.find_module
-        self.module_name = os.path.splitext(self.real_name)[0]
+        self._spec_name = os.path.splitext(self.real_name)[0]
+        # pretty name
+        self.module_name = os.path.splitext(self.name)[0]
+
+        self._module: ModuleInterface | None = None
+        self._globals: dict[str, Any] = {}
+
+        self.initialised = False
+        self.dependencies = []
 
+        self.meta = PluginMeta()
+
+        if lazy:
+            self.meta = meta or read_metadata(self.source)
+        else:
+            self._load()
+
+    def __repr__(self) -> str:
+        return f"<Plugin {self.path}>"
+
+    def _load(self) -> ModuleInterface:
         spec = importlib.util.spec_from_file_location(
-            self.module_name, self.path
+            self._spec_name, self.source
         )
         assert spec is not None
         assert spec.loader is not None
-        self.module = typing.cast(
+        module = typing.cast(
             ModuleInterface, importlib.util.module_from_spec(spec)
         )
 
-        setattr(self.module, "PLUGIN_PATH", self.path)
+        setattr(module, "__builtins__", self.context.namespace)
+        setattr(module, "PLUGIN_PATH", self.source)
 
         # XXX this assert had previously been commented due to issues
         # - it may need to be commented out again after further testing
-        assert isinstance(spec.loader, importlib.abc.Loader)
-        spec.loader.exec_module(self.module)
-
-        # after module is found, it's safe to use pretty name
-        self.module_name = os.path.splitext(self.name)[0]
+        # (importlib.abc is only imported here as it's slow to import)
+        from importlib.abc import Loader
+
+        assert isinstance(spec.loader, Loader)
+        with profiler.measure("import", self.path), self._registering():
+            spec.loader.exec_module(module)
+
+        for k in self._globals.keys():
+            setattr(module, k, self._globals[k])
+
+        self._module = module
+        return module
+
+    @property
+    def module(self) -> ModuleInterface:
+        if self._module is None:
+            with _init_lock:
+                if self._module is None:
+                    return self._load()
+        assert self._module is not None
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    @property
+    def description(self) -> str:
+        if self._module is not None:
+            return str(self._module.__doc__)
+        return str(self.meta.doc)
+
+    @property
+    def has_run(self) -> bool:
+        if self._module is not None:
+            return hasattr(self._module, "run")
+        return self.meta.has_run
+
+    @property
+    def has_doOnce(self) -> bool:
+        if self._module is not None:
+            return hasattr(self._module, "doOnce")
+        return self.meta.has_doOnce
+
+    def _declaration(
+        self, name: str, meta_value: list[str] | None
+    ) -> list[str] | None:
+        if self._module is not None:
+            value = getattr(self._module, name, None)
+            return None if value is None else list(value)
+        return meta_value
+
+    @property
+    def events(self) -> list[str] | None:
+        """Events which require this plugin to be initialised"""
+        return self._declaration("PLUGIN_EVENTS", self.meta.events)
+
+    @property
+    def depends(self) -> list[str] | None:
+        """Paths (relative to plugins.d) of plugins to initialise first"""
+        return self._declaration("PLUGIN_DEPENDS", self.meta.depends)
+
+    @property
+    def locks(self) -> list[str]:
+        """Names of locks to hold whilst running in a batch"""
+        return self._declaration("PLUGIN_LOCKS", self.meta.locks) or []
+
+    @property
+    def timeout(self) -> float | None:
+        """Seconds `run` may take when run in an isolated worker"""
+        if self._module is not None:
+            value = getattr(self._module, "PLUGIN_TIMEOUT", None)
+            return None if value is None else float(value)
+        return self.meta.timeout
+
+    @property
+    def deferred(self) -> bool:
+        return self.events is not None or self.depends is not None
+
+    def _registering(self) -> contextlib.AbstractContextManager[None]:
+        """Record event handlers added by the plugin as its own"""
+        event_manager = self.context.get("eventManager")
+        if isinstance(event_manager, EventManager):
+            return event_manager.registering(self)
+        return contextlib.nullcontext()
 
     def doOnce(self):
-        if hasattr(self.module, "doOnce"):
-            self.module.doOnce()
+        if self.has_doOnce:
+            module = self.module
+            with profiler.measure("doOnce", self.path), self._registering():
+                module.doOnce()
+
+    def init(self) -> None:
+        """Initialise plugin (i.e. run `doOnce`) unless already done;
+        dependencies are initialised first"""
+        with _init_lock:
+            if self.initialised:
+                return
+            self.initialised = True
+            for dependency in self.dependencies:
+                dependency.init()
+            self.doOnce()
+
+    def reload(self) -> None:
+        """Re-read plugin after its source has changed. If it had been
+        loaded it is re-executed (and re-initialised if it had been), after
+        removing any event handlers registered by the old module."""
+        with _init_lock:
+            old_module = self._module
+            was_initialised = self.initialised
+            self._module = None
+            self.initialised = False
+            self.meta = read_metadata(self.source)
+            if old_module is None:
+                return
+
+            event_manager = self.context.get("eventManager")
+            if isinstance(event_manager, EventManager):
+                event_manager.remove_handlers(self)
+            self._load()
+            if was_initialised:
+                self.init()
 
     def updateGlobals(self, newglobals: dict[str, Any]) -> None:
-        for k in newglobals.keys():
-            setattr(self.module, k, newglobals[k])
+        """Set globals for this plugin only (overriding the context)"""
+        self._globals.update(newglobals)
+        if self._module is not None:
+            for k in newglobals.keys():
+                setattr(self._module, k, newglobals[k])
 
     def run(self) -> str | None:
-        assert hasattr(self.module, "run")
-        ret: str | None = self.module.run()
+        assert self.has_run
+        self.init()
+        with self._registering():
+            ret: str | None = self.module.run()
         assert ret is None or isinstance(ret, str)
 
         # default behaviour is to go to previous
@@ -132,14 +949,54 @@ class Plugin:
             return ret or "advanced"
 
 
+def _toplevel_names(body: list[ast.stmt]) -> set[str]:
+    """Return names bound at module level (including within top level
+    if/try/with blocks) by the given statements"""
+    names: set[str] = set()
+    for node in body:
+        if isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        ):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = (
+                node.targets if isinstance(node, ast.Assign) else [node.target]
+            )
+            for target in targets:
+                for sub in ast.walk(target):
+                    if isinstance(sub, ast.Name):
+                        names.add(sub.id)
+        elif isinstance(node, ast.If):
+            names |= _toplevel_names(node.body)
+            names |= _toplevel_names(node.orelse)
+        elif isinstance(node, ast.Try):
+            names |= _toplevel_names(node.body)
+            names |= _toplevel_names(node.orelse)
+            names |= _toplevel_names(node.finalbody)
+            for handler in node.handlers:
+                names |= _toplevel_names(handler.body)
+        elif isinstance(node, ast.With):
+            names |= _toplevel_names(node.body)
+    return names
+
+
 class PluginDir:
     """Object that mimics behaviour of a plugin but acts only as a menu node"""
 
     parent: str | None
     plugins: list["Plugin | PluginDir"]
 
-    def __init__(self, path: str) -> None:
+    def __init__(
+        self,
+        path: str,
+        description: str | None = None,
+        context: PluginContext | None = None,
+    ) -> None:
         self.path = path
+        self.context = context or PluginContext()
         self.real_name = os.path.basename(path)
         self.name = re.sub(r"^[\d]*", "", self.real_name).replace("_", " ")
 
@@ -147,16 +1004,12 @@ class PluginDir:
 
         self.module_name = self.name
 
-        self.module_globals: dict[str, Any] = {}
-
-        if os.path.isfile(os.path.join(path, "description")):
-            with open(os.path.join(path, "description"), "r") as fob:
-                self.description = fob.read()
-        else:
-            self.description = ""
+        if description is None:
+            description = _read_description(path)
+        self.description = description
 
     def updateGlobals(self, newglobals: dict[str, Any]) -> None:
-        self.module_globals.update(newglobals)
+        self.context.update(newglobals)
 
     def doOnce(self): ...
 
@@ -164,12 +1017,9 @@ class PluginDir:
         items = []
         plugin_map: dict[str, Plugin | PluginDir] = {}
         for plugin in self.plugins:
-            if isinstance(plugin, Plugin) and hasattr(plugin.module, "run"):
+            if isinstance(plugin, Plugin) and plugin.has_run:
                 items.append(
-                    (
-                        plugin.module_name.capitalize(),
-                        str(plugin.module.__doc__),
-                    )
+                    (plugin.module_name.capitalize(), plugin.description)
                 )
                 plugin_map[plugin.module_name.capitalize()] = plugin
             elif isinstance(plugin, PluginDir):
@@ -178,7 +1028,7 @@ class PluginDir:
                 )
                 plugin_map[plugin.module_name.capitalize()] = plugin
 
-        retcode, choice = self.module_globals["console"].menu(
+        retcode, choice = self.context.console.menu(
             self.module_name.capitalize(),
             self.module_name.capitalize() + "\n",
             items,
@@ -198,82 +1048,686 @@ class PluginDir:
             return v
 
 
+def _read_description(path: str) -> str:
+    try:
+        with open(os.path.join(path, "description"), "r") as fob:
+            return fob.read()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return ""
+
+
+def run_batch(
+    plugins: list[Plugin], max_workers: int | None = None
+) -> dict[str, BaseException | None]:
+    """Initialise and run each plugin's `run` in one process, concurrently
+    where possible. A plugin is only started once all other plugins in the
+    batch that it depends on (`PLUGIN_DEPENDS`) have finished successfully
+    and no running plugin holds any of its `PLUGIN_LOCKS`. Returns a dict
+    of plugin path to the exception raised by it (or None on success)."""
+    from concurrent.futures import (
+        FIRST_COMPLETED,
+        Future,
+        ThreadPoolExecutor,
+        wait,
+    )
+
+    batch = {plugin.path: plugin for plugin in plugins}
+    waiting_on = {
+        path: {dep.path for dep in plugin.dependencies if dep.path in batch}
+        for path, plugin in batch.items()
+    }
+    results: dict[str, BaseException | None] = {}
+    held: set[str] = set()
+    running: dict["Future[None]", Plugin] = {}
+
+    def run(plugin: Plugin) -> None:
+        plugin.init()
+        plugin.module.run()
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        while waiting_on or running:
+            for path in list(waiting_on):
+                failed = [dep for dep in waiting_on[path] if results.get(dep)]
+                if failed:
+                    del waiting_on[path]
+                    results[path] = PluginError(
+                        f"not run, dependency failed: {', '.join(failed)}"
+                    )
+                    continue
+                plugin = batch[path]
+                if waiting_on[path] - results.keys():
+                    continue
+                if held.intersection(plugin.locks):
+                    continue
+                del waiting_on[path]
+                held.update(plugin.locks)
+                running[pool.submit(run, plugin)] = plugin
+
+            if not running:
+                # nothing runnable but plugins still waiting; i.e. a cycle
+                for path in waiting_on:
+                    results[path] = PluginError("not run, circular dependency")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                plugin = running.pop(future)
+                held.difference_update(plugin.locks)
+                results[plugin.path] = future.exception()
+
+    return results
+
+
+class PluginIndex:
+    """Persistent index of the plugin tree
+
+    Holds the directory listing, mode and mtime of every plugin (executable
+    or not), its `PluginMeta` and the description of every directory, of
+    each of the given plugin directories (which need not exist). On
+    `scan` the index is revalidated with a single stat of each known path;
+    directories are only re-listed and plugins only re-parsed when their
+    mtime (or size/mode) has changed.
+    """
+
+    VERSION = 5
+
+    def __init__(self, index_path: str, plugin_paths: list[str]) -> None:
+        self.index_path = index_path
+        self.plugin_paths = plugin_paths
+        self._dirs: dict[str, dict[str, Any]] = {}
+        self._files: dict[str, dict[str, Any]] = {}
+        self._dirty = False
+
+    def _read(self) -> None:
+        try:
+            with open(self.index_path) as fob:
+                data = json.load(fob)
+        except (OSError, ValueError):
+            return
+
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != self.VERSION
+            or data.get("plugin_paths") != self.plugin_paths
+        ):
+            return
+        self._dirs = data["dirs"]
+        self._files = data["files"]
+
+    def _write(self) -> None:
+        data = {
+            "version": self.VERSION,
+            "plugin_paths": self.plugin_paths,
+            "dirs": self._dirs,
+            "files": self._files,
+        }
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(tmp_path, "w") as fob:
+                json.dump(data, fob)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # the index is only a cache; carry on without it
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _scan_dir(
+        self,
+        path: str,
+        old_dirs: dict[str, dict[str, Any]],
+        old_files: dict[str, dict[str, Any]],
+    ) -> None:
+        st = os.stat(path)
+        cached = old_dirs.get(path)
+        if cached is None or cached["mtime_ns"] != st.st_mtime_ns:
+            self._dirty = True
+            files = []
+            dirs = []
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if entry.name != "__pycache__":
+                            dirs.append(entry.name)
+                    elif entry.name.endswith(".py") and entry.is_file():
+                        files.append(entry.name)
+            cached = {
+                "mtime_ns": st.st_mtime_ns,
+                "files": sorted(files),
+                "dirs": sorted(dirs),
+                "has_description": os.path.isfile(
+                    os.path.join(path, "description")
+                ),
+                "description_mtime_ns": None,
+                "description": "",
+            }
+        else:
+            cached = dict(cached)
+
+        if cached["has_description"]:
+            desc_path = os.path.join(path, "description")
+            try:
+                desc_mtime_ns: int | None = os.stat(desc_path).st_mtime_ns
+            except FileNotFoundError:
+                desc_mtime_ns = None
+            if desc_mtime_ns != cached["description_mtime_ns"]:
+                self._dirty = True
+                cached["description"] = _read_description(path)
+                cached["description_mtime_ns"] = desc_mtime_ns
+
+        self._dirs[path] = cached
+
+        for file_name in cached["files"]:
+            file_path = os.path.join(path, file_name)
+            try:
+                fst = os.stat(file_path)
+            except FileNotFoundError:
+                self._dirty = True
+                continue
+            stat_key = [fst.st_mode, fst.st_mtime_ns, fst.st_size]
+            entry_cache = old_files.get(file_path)
+            if entry_cache is None or entry_cache["stat"] != stat_key:
+                self._dirty = True
+                meta = None
+                if fst.st_mode & 0o111 != 0:
+                    meta = asdict(read_metadata(file_path))
+                entry_cache = {"stat": stat_key, "meta": meta}
+            self._files[file_path] = entry_cache
+
+        for dir_name in cached["dirs"]:
+            dir_path = os.path.join(path, dir_name)
+            if os.path.islink(dir_path):
+                # os.walk does not follow symlinks; neither do we
+                self._dirs[dir_path] = {
+                    "mtime_ns": None,
+                    "files": [],
+                    "dirs": [],
+                    "has_description": False,
+                    "description_mtime_ns": None,
+                    "description": _read_description(dir_path),
+                }
+                continue
+            try:
+                self._scan_dir(dir_path, old_dirs, old_files)
+            except FileNotFoundError:
+                self._dirty = True
+
+    def scan(self) -> tuple[dict[str, PluginMeta], dict[str, str]]:
+        """Revalidate (and if changed, rewrite) the index. Returns a dict of
+        plugin paths to metadata and a dict of (sub)directory paths to
+        descriptions"""
+        self._read()
+        old_dirs, old_files = self._dirs, self._files
+        self._dirs, self._files = {}, {}
+        self._dirty = False
+
+        for plugin_path in self.plugin_paths:
+            if os.path.isdir(plugin_path):
+                self._scan_dir(plugin_path, old_dirs, old_files)
+            elif plugin_path in old_dirs:
+                self._dirty = True
+        if self._dirty or old_files.keys() != self._files.keys():
+            self._write()
+
+        plugins = {
+            path: PluginMeta(**entry["meta"])
+            for path, entry in self._files.items()
+            if entry["meta"] is not None
+        }
+        dirs = {
+            path: entry["description"]
+            for path, entry in self._dirs.items()
+            if path not in self.plugin_paths
+        }
+        return plugins, dirs
+
+
 class PluginManager:
-    """Object that holds various information about multiple `plugins`"""
+    """Object that holds various information about multiple `plugins`
+
+    If `lazy` is set, plugins are not executed when the manager is created;
+    see `Plugin`. If `index` (path to an index file) is given, the plugin
+    tree is read from (and kept up to date in) a `PluginIndex` rather than
+    walked and parsed on every start. If `background` is set, plugins are
+    loaded and initialised on a separate thread; call `wait` before using
+    the plugin tree.
+
+    Plugins are initialised (`Plugin.init`) once the tree is loaded, except
+    for deferred plugins which are initialised on first `run`, on first
+    import via an `imp*` function, or when one of their `PLUGIN_EVENTS` is
+    first fired. If `eager_init` is not set, all plugins are treated as
+    deferred; useful when only a single plugin will be run.
+
+    Plugins are read from `path` and then from each of `overlays` (if they
+    exist) into a single tree, keyed by path within `path`. A plugin (by
+    path relative to its plugin directory) in a later overlay replaces the
+    same plugin in `path` or an earlier overlay; directories are merged.
+
+    Once `watch` has been called, changes to the plugin tree are applied by
+    `poll_changes` (see below), without reloading unchanged plugins.
+
+    `module_globals` are set on the shared `context` (a `PluginContext`),
+    along with the `imp*` functions.
+    """
 
     path_map: OrderedDict[str, Plugin | PluginDir] = OrderedDict()
 
-    def __init__(self, path: str, module_globals: dict[str, Any]) -> None:
+    def __init__(
+        self,
+        path: str,
+        module_globals: dict[str, Any],
+        lazy: bool = False,
+        index: str | None = None,
+        background: bool = False,
+        eager_init: bool = True,
+        overlays: list[str] | None = None,
+    ) -> None:
         path = os.path.realpath(path)  # Just in case
-        path_map: dict[str, Plugin | PluginDir] = {}
         self.plugin_path = path
-
-        module_globals.update(
+        # in order of increasing precedence
+        self.plugin_paths = [path]
+        for overlay in overlays or []:
+            overlay = os.path.realpath(overlay)
+            if overlay not in self.plugin_paths:
+                self.plugin_paths.append(overlay)
+        self.eager_init = eager_init
+
+        self.context = PluginContext(module_globals)
+        self.context.update(
             {
-                "impByName": lambda *a, **k: self.impByName(*a, **k),
-                "impByDir": lambda *a, **k: self.impByDir(*a, **k),
-                "impByPath": lambda *a, **k: self.impByPath(*a, **k),
+                "impByName": self.impByName,
+                "impByDir": self.impByDir,
+                "impByPath": self.impByPath,
             }
         )
 
-        self.module_globals = module_globals
-
         if not os.path.isdir(path):
             raise PluginError(f"Plugin directory '{path}' does not exist!")
 
-        for root, dirs, files in os.walk(path):
-            for file_name in files:
-                if not file_name.endswith(".py"):
-                    continue
+        self.path_map = OrderedDict()
+        self._children: dict[str, list[Plugin | PluginDir]] = {}
+        self._by_name: dict[str, list[Plugin | PluginDir]] = {}
+
+        self._lock = threading.Lock()
+        _renew_lock_after_fork(self)
+        self._inotify: inotify.Inotify | None = None
+        self._loaded = threading.Event()
+        self._load_error: BaseException | None = None
+
+        if background:
+            threading.Thread(
+                target=self._load_in_background,
+                args=(lazy, index, profiler.hold()),
+                name="plugin-loader",
+                daemon=True,
+            ).start()
+        else:
+            with profiler.measure("load", "plugins"):
+                self._load(lazy, index)
+            self.wait()
+
+    def _load_in_background(
+        self, lazy: bool, index: str | None, profiling: bool
+    ) -> None:
+        # the start up profile covers loading, even once the first screen
+        # has been painted
+        try:
+            with profiler.measure("load", "plugins"):
+                self._load(lazy, index)
+        finally:
+            if profiling:
+                profiler.release()
+
+    def _load(self, lazy: bool, index: str | None) -> None:
+        try:
+            files: dict[str, PluginMeta | None] = {}
+            dirs: dict[str, str] = {}
+            if index:
+                files, dirs = PluginIndex(index, self.plugin_paths).scan()
+            else:
+                for plugin_path in self.plugin_paths:
+                    if os.path.isdir(plugin_path):
+                        self._scan_tree(plugin_path, files, dirs)
+
+            plugins, descriptions = self._overlay(files, dirs)
+            path_map: dict[str, Plugin | PluginDir] = {}
+            for file_path, (source, meta) in plugins.items():
+                path_map[file_path] = Plugin(
+                    file_path, lazy, meta, self.context, source
+                )
+            for dir_path, description in descriptions.items():
+                path_map[dir_path] = PluginDir(
+                    dir_path, description, self.context
+                )
 
-                file_path = os.path.join(root, file_name)
-                if os.path.isfile(file_path):
-                    if not os.stat(file_path).st_mode & 0o111 == 0:
-                        path_map[file_path] = Plugin(file_path)
+            with self._lock:
+                self.path_map = OrderedDict(
+                    sorted(path_map.items(), key=lambda x: x[0])
+                )
+                self._build_indexes()
+
+            for plugin in self.path_map.values():
+                if isinstance(plugin, Plugin):
+                    self._init_plugin(plugin)
+        except BaseException as e:
+            self._load_error = e
+        finally:
+            self._loaded.set()
+
+    def _init_plugin(self, plugin: Plugin) -> None:
+        """Initialise plugin now, or register it to be initialised when
+        needed if it's deferred"""
+        event_manager = self.context.get("eventManager")
+        if self.eager_init and not plugin.deferred:
+            # Run plugin init
+            plugin.init()
+        elif isinstance(event_manager, EventManager):
+            for event in plugin.events or []:
+                event_manager.add_initialiser(event, plugin.init, plugin)
+
+    @property
+    def loaded(self) -> bool:
+        """Set once all plugins are loaded and initialised"""
+        return self._loaded.is_set()
+
+    def wait(self) -> None:
+        """Block until all plugins are loaded and initialised; re-raises any
+        error raised whilst loading"""
+        self._loaded.wait()
+        if self._load_error is not None:
+            raise self._load_error
+
+    @staticmethod
+    def _scan_tree(
+        path: str, files: dict[str, PluginMeta | None], dirs: dict[str, str]
+    ) -> None:
+        """Add plugins (executable .py files) and directories (with their
+        descriptions) found under `path` to `files` and `dirs`; one
+        `os.scandir` pass per directory, using the file type and stat
+        results cached by each `DirEntry`. Like `os.walk`, symlinked
+        directories are listed but not descended into."""
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if entry.name == "__pycache__":
+                        continue
+                    dirs[entry.path] = _read_description(entry.path)
+                    if not entry.is_symlink():
+                        PluginManager._scan_tree(entry.path, files, dirs)
+                elif entry.name.endswith(".py") and entry.is_file():
+                    if entry.stat().st_mode & 0o111 != 0:
+                        files[entry.path] = None
+
+    def _overlay(
+        self, files: dict[str, PluginMeta | None], dirs: dict[str, str]
+    ) -> tuple[dict[str, tuple[str, PluginMeta | None]], dict[str, str]]:
+        """Merge plugins and directories found in each plugin directory
+        into one tree. Returns a dict of path (within `plugin_path`) to
+        (source path, metadata) of each plugin, and a dict of path to
+        description of each directory"""
+        plugins: dict[str, tuple[str, PluginMeta | None]] = {}
+        descriptions: dict[str, str] = {}
+        for plugin_path in self.plugin_paths:
+            prefix = plugin_path + os.sep
+            for source, meta in files.items():
+                if source.startswith(prefix):
+                    path = os.path.join(
+                        self.plugin_path, source[len(prefix):]
+                    )
+                    plugins[path] = (source, meta)
+            for source, description in dirs.items():
+                if source.startswith(prefix):
+                    path = os.path.join(
+                        self.plugin_path, source[len(prefix):]
+                    )
+                    if description or path not in descriptions:
+                        descriptions[path] = description
+        return plugins, descriptions
 
-            for dir_name in dirs:
-                if dir_name == "__pycache__":
-                    continue
-                dir_path = os.path.join(root, dir_name)
+    def _build_indexes(self) -> None:
+        """(Re)build the parent -> children and name -> plugins indexes from
+        `path_map` and link plugins to their parent directory"""
+        children: dict[str, list[Plugin | PluginDir]] = {}
+        by_name: dict[str, list[Plugin | PluginDir]] = {}
 
-                if os.path.isdir(dir_path):
-                    path_map[dir_path] = PluginDir(dir_path)
+        for key, plugin in self.path_map.items():
+            children.setdefault(os.path.dirname(key), []).append(plugin)
+            by_name.setdefault(plugin.module_name, []).append(plugin)
 
+        for key, plugin in self.path_map.items():
+            if isinstance(plugin, Plugin):
+                plugin.dependencies = self._dependencies(plugin)
+            elif isinstance(plugin, PluginDir):
+                sub_plugins = children.get(key, [])
+                for sub_plugin in sub_plugins:
+                    sub_plugin.parent = key
+                plugin.plugins = list(sub_plugins)
+
+        self._children = children
+        self._by_name = by_name
+
+    def _dependencies(self, plugin: Plugin) -> list[Plugin]:
+        dependencies = []
+        for dep_path in plugin.depends or []:
+            dep = self.path_map.get(os.path.join(self.plugin_path, dep_path))
+            if isinstance(dep, Plugin):
+                dependencies.append(dep)
+        return dependencies
+
+    def watch(self) -> None:
+        """Start watching the plugin tree (with inotify) for changes; call
+        `poll_changes` to apply them"""
+        if self._inotify is not None:
+            return
+        self._inotify = inotify.Inotify()
+        for plugin_path in self.plugin_paths:
+            self._add_watches(plugin_path)
+
+    def _add_watches(self, path: str) -> None:
+        assert self._inotify is not None
+        for root, dirs, _ in os.walk(path):
+            dirs[:] = [d for d in dirs if d != "__pycache__"]
+            self._inotify.add_watch(root, WATCH_MASK)
+
+    def _rm_watches(self, path: str) -> None:
+        assert self._inotify is not None
+        for wd, watch_path in list(self._inotify.watches.items()):
+            if watch_path == path or watch_path.startswith(path + os.sep):
+                self._inotify.rm_watch(wd)
+
+    def poll_changes(self, timeout: float = 0) -> list[str]:
+        """Apply changes to the plugin tree (if `watch`ing) and return the
+        paths of added, changed and removed plugins and PluginDirs.
+
+        Only changed plugins are re-read (and re-executed if they had been
+        loaded) and only the PluginDir lists (i.e. menus) and indexes which
+        contain them are rebuilt. If a changed plugin can't be read, the
+        tree is still updated before the (first) error is raised."""
+        if self._inotify is None or not self._loaded.is_set():
+            return []
+
+        paths = set()
+        for event in self._inotify.read(timeout):
+            if not event.name:
+                continue
+            is_dir = event.mask & inotify.IN_ISDIR
+            if event.mask & inotify.IN_CREATE and not is_dir:
+                continue  # wait until written (IN_CLOSE_WRITE)
+            path = event.path
+            if event.name == "description":
+                path = event.watch_path
+            elif not (is_dir or event.name.endswith(".py")):
+                continue
+            for plugin_path in self.plugin_paths:
+                if path.startswith(plugin_path + os.sep):
+                    rel_path = path[len(plugin_path) + 1:]
+                    paths.add(os.path.join(self.plugin_path, rel_path))
+                    break
+
+        changed: set[str] = set()
+        error: Exception | None = None
+        with self._lock:
+            for path in sorted(paths):
+                try:
+                    changed |= self._sync_path(path)
+                except Exception as e:
+                    changed.add(path)
+                    error = error or e
+            if changed:
+                self._reindex(changed)
+        if error is not None:
+            raise error
+        return sorted(changed)
+
+    def _sync_path(self, path: str) -> set[str]:
+        """Update `path_map` at (and under) `path` to match the plugin
+        directories; returns paths of added, changed or removed entries"""
+        rel_path = os.path.relpath(path, self.plugin_path)
+        files: dict[str, PluginMeta | None] = {}
+        dirs: dict[str, str] = {}
+        for plugin_path in self.plugin_paths:
+            source = os.path.join(plugin_path, rel_path)
+            if os.path.isdir(source):
+                dirs[source] = _read_description(source)
+                self._scan_tree(source, files, dirs)
+                self._add_watches(source)
+                continue
+            # the kernel only drops watches of deleted directories, not of
+            # those moved out of the tree
+            self._rm_watches(source)
+            if os.path.isfile(source) and os.stat(source).st_mode & 0o111:
+                files[source] = None
+        plugins, descriptions = self._overlay(files, dirs)
+
+        changed = set()
+        new_map: dict[str, Plugin | PluginDir] = {}
+        for key in list(self.path_map):
+            if key == path or key.startswith(path + os.sep):
+                current = self.path_map[key]
+                if isinstance(current, Plugin) and key in plugins:
+                    continue
+                if isinstance(current, PluginDir) and key in descriptions:
+                    continue
+                self._remove(key)
+                changed.add(key)
+
+        for key, description in descriptions.items():
+            current = self.path_map.get(key)
+            if current is None:
+                new_map[key] = PluginDir(key, description, self.context)
+            elif isinstance(current, PluginDir):
+                if current.description == description:
+                    continue
+                current.description = description
+            changed.add(key)
+
+        new_plugins = []
+        for key, (source, _) in plugins.items():
+            current = self.path_map.get(key)
+            if current is None:
+                plugin = Plugin(key, True, None, self.context, source)
+                new_map[key] = plugin
+                new_plugins.append(plugin)
+            elif isinstance(current, Plugin):
+                if key != path and current.source == source:
+                    continue
+                current.source = source
+                current.reload()
+                # its PLUGIN_EVENTS may have changed
+                self._forget(current)
+                if not current.initialised:
+                    self._init_plugin(current)
+            changed.add(key)
+
+        self._add(new_map)
+        for plugin in new_plugins:
+            self._init_plugin(plugin)
+        return changed
+
+    def _remove(self, path: str) -> None:
+        old = self.path_map.pop(path)
+        if isinstance(old, Plugin):
+            self._forget(old)
+            event_manager = self.context.get("eventManager")
+            if isinstance(event_manager, EventManager):
+                event_manager.remove_handlers(old)
+
+    def _forget(self, plugin: Plugin) -> None:
+        """Drop initialisers registered for plugin (see `_init_plugin`)"""
+        event_manager = self.context.get("eventManager")
+        if isinstance(event_manager, EventManager):
+            event_manager.remove_initialisers(plugin)
+
+    def _add(self, new_map: dict[str, Plugin | PluginDir]) -> None:
+        if not new_map:
+            return
+        path_map = dict(self.path_map)
+        path_map.update(new_map)
         self.path_map = OrderedDict(
             sorted(path_map.items(), key=lambda x: x[0])
         )
-        for key in path_map.keys():
-            plugin = path_map[key]
-            if isinstance(plugin, Plugin):
-                # Run plugin init
-                plugin.updateGlobals(module_globals)
-                plugin.doOnce()
-
-        for key in self.path_map:
-            if os.path.isdir(key):
-                sub_plugins = self.getByDir(key)
-                for plugin in sub_plugins:
-                    plugin.parent = key
-                v = self.path_map[key]
-                assert isinstance(v, PluginDir)
-                v.plugins = list(sub_plugins)
+
+    def _reindex(self, paths: set[str]) -> None:
+        """Update the indexes (and PluginDir lists) affected by changes to
+        the given paths; cf. `_build_indexes`"""
+        parents = {os.path.dirname(path) for path in paths}
+        names = set()
+        for path in paths:
+            plugin = self.path_map.get(path)
+            if plugin is not None:
+                names.add(plugin.module_name)
+        for plugins in self._by_name.values():
+            names.update(p.module_name for p in plugins if p.path in paths)
+
+        children: dict[str, list[Plugin | PluginDir]] = {
+            parent: [] for parent in parents
+        }
+        by_name: dict[str, list[Plugin | PluginDir]] = {
+            name: [] for name in names
+        }
+        for key, plugin in self.path_map.items():
+            parent = os.path.dirname(key)
+            if parent in children:
+                children[parent].append(plugin)
+            if plugin.module_name in by_name:
+                by_name[plugin.module_name].append(plugin)
+
+        self._children.update(children)
+        self._by_name.update(by_name)
+        for parent, sub_plugins in children.items():
+            for sub_plugin in sub_plugins:
+                sub_plugin.parent = (
+                    parent if parent != self.plugin_path else None
+                )
+            parent_dir = self.path_map.get(parent)
+            if isinstance(parent_dir, PluginDir):
+                parent_dir.plugins = list(sub_plugins)
+        for path in paths:
+            plugin = self.path_map.get(path)
+            if isinstance(plugin, PluginDir):
+                plugin.plugins = list(self._children.get(path, []))
+
+        # dependencies may have been added, changed or removed
+        rel_paths = {os.path.relpath(path, self.plugin_path) for path in paths}
+        for key, plugin in self.path_map.items():
+            if isinstance(plugin, Plugin) and (
+                key in paths or rel_paths.intersection(plugin.depends or [])
+            ):
+                plugin.dependencies = self._dependencies(plugin)
 
     def updateGlobals(self, newglobals: dict[str, Any]) -> None:
-        for plugin in self.path_map.values():
-            plugin.updateGlobals(newglobals)
-            # self.module_globals.update(newglobals)
+        """Set globals for all plugins (see `PluginContext`)"""
+        self.context.update(newglobals)
 
     def getByName(self, name: str) -> Iterable[Plugin | PluginDir]:
         """Return list of plugin objects matching given name"""
-        return filter(lambda x: x.module_name == name, self.path_map.values())
+        return list(self._by_name.get(name, []))
 
     def getByDir(self, path: str) -> Iterable[Plugin | PluginDir]:
         """Return a list of plugin objects in given directory"""
-        plugins = []
-        for path_key in self.path_map:
-            if os.path.dirname(path_key) == path:
-                plugins.append(self.path_map[path_key])
-        return plugins
+        return list(self._children.get(path, []))
 
     def getByPath(self, path: str) -> Plugin | PluginDir | None:
         """Return plugin object with exact given path or None"""
@@ -285,7 +1739,8 @@ class PluginManager:
         matching given name"""
 
         modules = [
-            x.module for x in self.getByName(name) if isinstance(x, Plugin)
+            self._import(x) for x in self.getByName(name)
+            if isinstance(x, Plugin)
         ]
 
         return list(filter(None, modules))
@@ -295,7 +1750,8 @@ class PluginManager:
         in given directory"""
 
         modules = [
-            x.module for x in self.getByDir(path) if isinstance(x, Plugin)
+            self._import(x) for x in self.getByDir(path)
+            if isinstance(x, Plugin)
         ]
 
         return list(filter(None, modules))
@@ -304,5 +1760,11 @@ class PluginManager:
         """Return a python module from plugin at given path or None"""
         out = self.getByPath(path)
         if out and isinstance(out, Plugin):
-            return out.module
+            return self._import(out)
         return None
+
+    def _import(self, plugin: Plugin) -> ModuleInterface:
+        # deferred plugins must be initialised before use by other plugins
+        if plugin.deferred or not self.eager_init:
+            plugin.init()
+        return plugin.module
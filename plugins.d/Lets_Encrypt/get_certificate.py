@@ -36,6 +36,9 @@ d_dom_example = join(share, "letsencrypt/dehydrated-confconsole.domains")
 example_domain = "example.com"
 # XXX Debug paths
 
+# only initialise (doOnce) when needed, after dns_01
+PLUGIN_DEPENDS = ["Lets_Encrypt/dns_01.py"]
+
 
 def doOnce() -> None:
     global dns_01
@@ -75,4 +75,10 @@ else
     configure_postfix "$@"
 fi
 
+# let any running confconsole know; a hook for plugins, no shipped plugin
+# handles it (see docs/Plugins.rst)
+if which confconsole-event >/dev/null; then
+    confconsole-event -q mail_relay_changed || true
+fi
+
 sleep 10
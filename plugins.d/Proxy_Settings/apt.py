@@ -42,10 +42,6 @@ def validate_address(addr: str) -> bool:
     return bool(parsed.scheme) and len(parsed.netloc.split(".")) > 1
 
 
-def doOnce():
-    pass
-
-
 def run():
     original_proxy = get_proxy()
     while True:
@@ -3,6 +3,10 @@
 import subprocess
 from subprocess import check_output, check_call
 
+# dpkg-reconfigure holds the debconf database lock; don't run concurrently
+# with other plugins which use debconf (see --plugins)
+PLUGIN_LOCKS = ["debconf"]
+
 
 def is_installed(pkg: str) -> bool:
     for line in check_output(
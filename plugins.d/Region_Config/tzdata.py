@@ -3,6 +3,10 @@
 import subprocess
 import os
 
+# dpkg-reconfigure holds the debconf database lock; don't run concurrently
+# with other plugins which use debconf (see --plugins)
+PLUGIN_LOCKS = ["debconf"]
+
 
 def run():
     flag = []
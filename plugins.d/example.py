@@ -19,6 +19,13 @@ impByDir    - a function, takes a path and returns all plugin modules within
               that directory.
 impByPath   - a function, takes a path and returns the plugin module at
               specified path or None.
+interactive - set if confconsole is running interactively.
+
+All of the above are provided by the shared plugin context, available as
+`context` (see plugin.PluginContext), which also provides:
+
+context.cache - a key/value cache shared between plugins.
+context.tasks - a background task runner; context.tasks.submit(func, *args).
 
 
 Plugin Functions/Scope:
@@ -28,12 +35,27 @@ main body - the main body is run at load time of the plugin, none of the
             plugins loaded.
 
 doOnce() - if defined is run once, after loading all plugins and before
-           running confconsole.
+           running confconsole (unless init is deferred, see below).
+
+PLUGIN_EVENTS - if declared (as a literal list of event names), plugin init
+                is deferred; doOnce is instead run on first run(), first
+                import by another plugin, or just before one of the listed
+                events is first fired.
+PLUGIN_DEPENDS - if declared (as a literal list of plugin paths relative to
+                 plugins.d), plugin init is deferred (as above) and the
+                 listed plugins are initialised first.
+
+PLUGIN_TIMEOUT - if declared (as a literal number), the number of seconds
+                 run() may take without interacting with the user, when run
+                 in an isolated worker (see isolate_plugins in
+                 confconsole.conf).
 
 run() - if defined is run whenever the plugin is selected, if not defined, no
         menu entry is created for this plugin.
 """
 
+PLUGIN_EVENTS = ["test_event"]
+
 
 def doOnce():
     eventManager.add_event("test_event")
@@ -0,0 +1,232 @@
+# Copyright (c) 2026 TurnKey GNU/Linux <admin@turnkeylinux.org>
+# - all rights reserved
+"""Run plugins in an isolated worker process
+
+A worker is forked from the UI process before it is needed (so it shares
+the loaded plugin tree) and imports the modules commonly used by plugins
+(requests, smtplib, ssl, etc) whilst the user is still navigating menus.
+A plugin's `run` is then called in the worker, with `console` replaced by a
+proxy which passes each console call back to the UI process over a pipe.
+
+So a plugin which hangs (e.g. on a network request) or crashes doesn't
+take the console with it: if it doesn't finish (or interact with the
+console) within its timeout, or the user presses Ctrl-C, the worker is
+killed and the user returned to the menu. Each worker runs a single
+plugin and is then replaced.
+
+Note that events fired by a plugin running in a worker are only handled
+within the worker.
+"""
+
+import time
+import signal
+import logging
+import importlib
+import traceback
+import multiprocessing
+from typing import Any
+
+import plugin
+
+log = logging.getLogger(__name__)
+
+# imported by each worker before it's needed
+PRELOAD_MODULES = [
+    "ssl",
+    "socket",
+    "smtplib",
+    "http.client",
+    "urllib.request",
+    "requests",
+]
+
+# seconds a worker may take to initialise a plugin (i.e. load it and run its
+# doOnce), even if it has no timeout; a fork can't be relied on not to have
+# inherited a lock held by one of the UI process' threads
+INIT_TIMEOUT = 60
+
+
+class PluginWorkerError(Exception):
+    pass
+
+
+class PluginTimeout(PluginWorkerError):
+    pass
+
+
+class ConsoleProxy:
+    """Stands in for `console` in a worker; console method calls are run by
+    the UI process"""
+
+    def __init__(self, conn: Any) -> None:
+        self._conn = conn
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def call(*args: Any, **kwargs: Any) -> Any:
+            self._conn.send(("call", name, args, kwargs))
+            status, value = self._conn.recv()
+            if status == "raise":
+                raise plugin.PluginError(f"console.{name} failed: {value}")
+            return value
+
+        call.__name__ = name
+        return call
+
+
+def _worker_main(conn: Any, pm: plugin.PluginManager) -> None:
+    # Ctrl-C is handled (by killing us) in the UI process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+    pm.updateGlobals({"console": ConsoleProxy(conn)})
+    try:
+        request = conn.recv()
+    except EOFError:
+        return
+    _, path = request
+    try:
+        p = pm.path_map[path]
+        assert isinstance(p, plugin.Plugin)
+        p.init()
+        conn.send(("initialised",))
+        ret = p.module.run()
+        conn.send(("done", ret if isinstance(ret, str) else None))
+    except BaseException:
+        conn.send(("error", traceback.format_exc()))
+
+
+class PluginWorker:
+    """Pre-forked worker to run plugins in (see module docstring)
+
+    `timeout` is the default number of seconds a plugin may run without
+    interacting with the console (a plugin's PLUGIN_TIMEOUT declaration
+    takes precedence); None or 0 for no timeout.
+    """
+
+    def __init__(
+        self,
+        pm: plugin.PluginManager,
+        console: Any,
+        timeout: float | None = None,
+    ) -> None:
+        self.pm = pm
+        self.console = console
+        self.timeout = timeout or None
+        self._ctx = multiprocessing.get_context("fork")
+        self._proc: Any = None
+        self._conn: Any = None
+
+    def prefork(self) -> None:
+        """Start a worker, if there isn't one already (and plugins have been
+        loaded)"""
+        if self._proc is not None or not self.pm.loaded:
+            return
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.pm),
+            name="confconsole-plugin-worker",
+            daemon=True,
+        )
+        proc.start()
+        child_conn.close()
+        self._proc, self._conn = proc, parent_conn
+
+    def stop(self) -> None:
+        """Kill the worker (if any)"""
+        proc, conn = self._proc, self._conn
+        self._proc = self._conn = None
+        if proc is None:
+            return
+        conn.close()
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+
+    def _run(self, p: plugin.Plugin) -> str | None:
+        self.prefork()
+        proc, conn = self._proc, self._conn
+        timeout = p.timeout or self.timeout
+        conn.send(("run", p.path))
+
+        init_timeout = min(timeout or INIT_TIMEOUT, INIT_TIMEOUT)
+        initialised = False
+
+        def get_deadline() -> float | None:
+            limit = timeout if initialised else init_timeout
+            return None if limit is None else time.monotonic() + limit
+
+        deadline = get_deadline()
+        while True:
+            wait = None
+            if deadline is not None:
+                wait = max(deadline - time.monotonic(), 0)
+            if not conn.poll(wait):
+                if not initialised:
+                    raise PluginTimeout(
+                        f"{p.module_name} did not initialise within"
+                        f" {init_timeout:g}s"
+                    )
+                raise PluginTimeout(
+                    f"{p.module_name} did not finish within {timeout:g}s"
+                )
+            try:
+                message = conn.recv()
+            except EOFError:
+                proc.join()
+                raise PluginWorkerError(
+                    f"{p.module_name} worker exited unexpectedly"
+                    f" (exit code {proc.exitcode})"
+                )
+
+            if message[0] == "initialised":
+                initialised = True
+                deadline = get_deadline()
+            elif message[0] == "call":
+                _, name, args, kwargs = message
+                try:
+                    value = getattr(self.console, name)(*args, **kwargs)
+                except Exception as e:
+                    conn.send(("raise", str(e)))
+                else:
+                    conn.send(("return", value))
+                # time spent waiting on the user doesn't count
+                deadline = get_deadline()
+            elif message[0] == "done":
+                return message[1]
+            else:
+                raise PluginWorkerError(
+                    f"{p.module_name} failed:\n{message[1]}"
+                )
+
+    def run(self, p: plugin.Plugin) -> str | None:
+        """Run plugin in the worker and return the next dialog (as
+        `Plugin.run`). If it times out or is cancelled (Ctrl-C), the user
+        is told so and returned to the plugin's menu."""
+        start = time.monotonic()
+        stopped = None
+        ret = None
+        try:
+            ret = self._run(p)
+        except PluginTimeout as e:
+            stopped = str(e)
+        except KeyboardInterrupt:
+            stopped = f"{p.module_name} cancelled"
+        finally:
+            # workers run a single plugin
+            self.stop()
+            log.info(
+                f"plugin {p.path} ran in worker for"
+                f" {time.monotonic() - start:.2f}s"
+            )
+        if stopped:
+            log.warning(f"plugin {p.path}: {stopped}")
+            self.console.msgbox("Plugin stopped", stopped)
+        return ret or p.parent
@@ -0,0 +1,178 @@
+# Copyright (c) 2026 TurnKey GNU/Linux <admin@turnkeylinux.org>
+# - all rights reserved
+"""Start up profiling (confconsole --profile-startup)
+
+Records wall time and memory allocated (as traced by tracemalloc) for each
+measured step of start up: plugin imports (exec_module), plugin doOnce,
+TurnkeyConsole init and the gap until the first screen is painted.
+
+Profiling is off unless `start` has been called, and ends (the report is
+emitted and tracemalloc stopped) at `finish`, i.e. on first paint or exit;
+otherwise `measure` and `mark` are (almost) free. Plugins loaded in the
+background `hold` profiling open past first paint until they're loaded.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Iterator
+
+log = logging.getLogger(__name__)
+
+REPORT_PATH = "/run/confconsole/startup-profile.json"
+
+
+class StartupProfiler:
+    def __init__(self) -> None:
+        import tracemalloc
+
+        self._tracemalloc = tracemalloc
+        tracemalloc.start()
+        self.started = time.perf_counter()
+        self.finished = False
+        self._holds = 0
+        self._finish_path: str | None = None
+        self._lock = threading.Lock()
+        self.records: list[dict[str, Any]] = []
+        self._logged = 0
+        self._last_end = self.started
+
+    def _record(
+        self, kind: str, name: str, start: float, end: float, alloc: int
+    ) -> None:
+        self.records.append(
+            {
+                "kind": kind,
+                "name": name,
+                "offset_ms": round((start - self.started) * 1000, 3),
+                "wall_ms": round((end - start) * 1000, 3),
+                "alloc_kb": round(alloc / 1024, 1),
+            }
+        )
+        self._last_end = max(self._last_end, end)
+
+    @contextmanager
+    def measure(self, kind: str, name: str) -> Iterator[None]:
+        mem_start = self._tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            mem_end = self._tracemalloc.get_traced_memory()[0]
+            self._record(kind, name, start, end, mem_end - mem_start)
+
+    def mark(self, kind: str, name: str) -> None:
+        """Record (the first time only) the gap since the end of the last
+        measured step"""
+        if self.finished or any(r["kind"] == kind for r in self.records):
+            return
+        self._record(kind, name, self._last_end, time.perf_counter(), 0)
+
+    def report(self) -> dict[str, Any]:
+        current, peak = self._tracemalloc.get_traced_memory()
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "traced_kb": round(current / 1024, 1),
+            "traced_peak_kb": round(peak / 1024, 1),
+            "steps": self.records,
+        }
+
+    def emit(self, path: str = REPORT_PATH) -> None:
+        """Write report as JSON to `path` and log each step not previously
+        logged to the journal (as STARTUP_* fields)"""
+        if self._logged and self._logged == len(self.records):
+            return
+
+        report = self.report()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as fob:
+                json.dump(report, fob, indent=2)
+        except OSError as e:
+            log.warning(f"failed to write startup profile to {path}: {e}")
+
+        for step in report["steps"][self._logged:]:
+            log.info(
+                f"startup {step['kind']} {step['name']}:"
+                f" {step['wall_ms']}ms {step['alloc_kb']}KiB",
+                extra={
+                    "STARTUP_KIND": step["kind"],
+                    "STARTUP_NAME": step["name"],
+                    "STARTUP_OFFSET_MS": step["offset_ms"],
+                    "STARTUP_WALL_MS": step["wall_ms"],
+                    "STARTUP_ALLOC_KB": step["alloc_kb"],
+                },
+            )
+        log.info(
+            f"startup total: {report['total_ms']}ms (report: {path})",
+            extra={
+                "STARTUP_TOTAL_MS": report["total_ms"],
+                "STARTUP_TRACED_PEAK_KB": report["traced_peak_kb"],
+            },
+        )
+        self._logged = len(self.records)
+
+    def hold(self) -> None:
+        """Defer `finish` until `release`d, e.g. whilst plugins are loaded
+        in the background"""
+        with self._lock:
+            self._holds += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._holds -= 1
+            path = self._finish_path if self._holds <= 0 else None
+        if path is not None:
+            self.finish(path)
+
+    def finish(self, path: str = REPORT_PATH, force: bool = False) -> None:
+        """Emit the report and stop profiling (and tracing allocations);
+        unless `force`d, not before any holds have been released"""
+        with self._lock:
+            if self.finished:
+                return
+            if self._holds > 0 and not force:
+                self._finish_path = path
+                return
+            self.finished = True
+        self.emit(path)
+        self._tracemalloc.stop()
+
+
+active: StartupProfiler | None = None
+
+
+def start() -> StartupProfiler:
+    global active
+    if active is None:
+        active = StartupProfiler()
+    return active
+
+
+def measure(kind: str, name: str) -> ContextManager[None]:
+    if active is None or active.finished:
+        return nullcontext()
+    return active.measure(kind, name)
+
+
+def mark(kind: str, name: str) -> None:
+    if active is not None and not active.finished:
+        active.mark(kind, name)
+
+
+def hold() -> bool:
+    """Hold profiling open (see `StartupProfiler.hold`); returns whether
+    it's to be released"""
+    if active is None or active.finished:
+        return False
+    active.hold()
+    return True
+
+
+def release() -> None:
+    if active is not None:
+        active.release()
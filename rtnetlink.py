@@ -0,0 +1,291 @@
+# Copyright (c) 2026 TurnKey GNU/Linux <admin@turnkeylinux.org>
+# - all rights reserved
+"""Minimal rtnetlink(7) interface (no external dependencies)
+
+Dumps all network links and their addresses (i.e. what `ip addr` shows) in
+a couple of netlink requests, rather than running a command per interface.
+Changes can also be waited for, by subscribing to notifications (see
+`Rtnetlink.read`).
+"""
+
+import os
+import errno
+import select
+import socket
+import struct
+from dataclasses import dataclass, field
+from typing import Iterator
+
+NETLINK_ROUTE = 0
+
+NLM_F_REQUEST = 0x01
+NLM_F_MULTI = 0x02
+NLM_F_ROOT = 0x100
+NLM_F_MATCH = 0x200
+NLM_F_DUMP = NLM_F_ROOT | NLM_F_MATCH
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+# returned by Rtnetlink.read if notifications were lost
+NLMSG_OVERRUN = 4
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+
+# multicast groups (notifications) to subscribe to
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+IFLA_IFNAME = 3
+IFLA_MASTER = 10
+IFLA_OPERSTATE = 16
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_FLAGS = 8
+
+IFA_F_TENTATIVE = 0x40
+IFA_F_DADFAILED = 0x08
+
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_SITE = 200
+RT_SCOPE_LINK = 253
+RT_SCOPE_HOST = 254
+
+_NLMSGHDR = struct.Struct("=IHHII")
+_IFINFOMSG = struct.Struct("=BxHiII")
+_IFADDRMSG = struct.Struct("=BBBBi")
+_RTATTR = struct.Struct("=HH")
+_U32 = struct.Struct("=I")
+
+
+class RtnetlinkError(Exception):
+    pass
+
+
+@dataclass
+class Address:
+    ifindex: int
+    family: int
+    address: str
+    prefixlen: int
+    scope: int
+    flags: int
+    label: str | None = None
+
+
+@dataclass
+class Link:
+    index: int
+    name: str
+    flags: int
+    # index of the bridge (or bond) this link is a port of
+    master: int | None = None
+    addresses: list[Address] = field(default_factory=list)
+
+    def get_addresses(
+        self, family: int, scope: int | None = None
+    ) -> list[Address]:
+        return [
+            addr
+            for addr in self.addresses
+            if addr.family == family and (scope is None or addr.scope == scope)
+        ]
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _attrs(data: bytes, offset: int) -> Iterator[tuple[int, bytes]]:
+    while offset + _RTATTR.size <= len(data):
+        length, rta_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        yield rta_type, data[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+
+
+def _string(value: bytes) -> str:
+    return value.rstrip(b"\0").decode(errors="replace")
+
+
+def parse_link(payload: bytes) -> Link:
+    _, _, index, flags, _ = _IFINFOMSG.unpack_from(payload)
+    link = Link(index, "", flags)
+    for rta_type, value in _attrs(payload, _IFINFOMSG.size):
+        if rta_type == IFLA_IFNAME:
+            link.name = _string(value)
+        elif rta_type == IFLA_MASTER:
+            link.master = _U32.unpack(value[:4])[0]
+    return link
+
+
+def parse_address(payload: bytes) -> Address | None:
+    family, prefixlen, flags, scope, index = _IFADDRMSG.unpack_from(payload)
+    attrs = dict(_attrs(payload, _IFADDRMSG.size))
+    # for IPv4, IFA_ADDRESS is the peer address of point-to-point links
+    raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+    if raw is None or family not in (socket.AF_INET, socket.AF_INET6):
+        return None
+    if IFA_FLAGS in attrs:
+        flags = _U32.unpack(attrs[IFA_FLAGS][:4])[0]
+    label = attrs.get(IFA_LABEL)
+    return Address(
+        index,
+        family,
+        socket.inet_ntop(family, raw),
+        prefixlen,
+        scope,
+        flags,
+        _string(label) if label is not None else None,
+    )
+
+
+def parse_messages(data: bytes) -> Iterator[tuple[int, int, bytes]]:
+    """Yield (type, flags, payload) of each netlink message in data"""
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, flags, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        yield msg_type, flags, data[offset + _NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+class Rtnetlink:
+    """NETLINK_ROUTE socket; use as a context manager or `close` it
+
+    `groups` (RTMGRP_*) are the notifications to subscribe to; a socket
+    which is subscribed to notifications shouldn't also be used for
+    dumps.
+    """
+
+    def __init__(self, groups: int = 0) -> None:
+        try:
+            self.sock = socket.socket(
+                socket.AF_NETLINK,
+                socket.SOCK_RAW | socket.SOCK_CLOEXEC,
+                NETLINK_ROUTE,
+            )
+            self.sock.bind((0, groups))
+        except (AttributeError, OSError) as e:
+            # AttributeError: AF_NETLINK is Linux only
+            raise RtnetlinkError(f"rtnetlink unavailable: {e}")
+        self._seq = 0
+
+    def __enter__(self) -> "Rtnetlink":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def request_dump(self, msg_type: int, payload: bytes) -> list[bytes]:
+        """Send a dump request; returns the payloads of the replies"""
+        self._seq += 1
+        seq = self._seq
+        header = _NLMSGHDR.pack(
+            _NLMSGHDR.size + len(payload),
+            msg_type,
+            NLM_F_REQUEST | NLM_F_DUMP,
+            seq,
+            0,
+        )
+        try:
+            self.sock.sendto(header + payload, (0, 0))
+        except OSError as e:
+            raise RtnetlinkError(f"netlink request failed: {e}")
+
+        replies = []
+        while True:
+            try:
+                data = self.sock.recv(64 * 1024)
+            except OSError as e:
+                raise RtnetlinkError(f"netlink receive failed: {e}")
+            for reply_type, _, reply in parse_messages(data):
+                if reply_type == NLMSG_DONE:
+                    return replies
+                if reply_type == NLMSG_ERROR:
+                    err = -struct.unpack_from("=i", reply)[0]
+                    if err:
+                        raise RtnetlinkError(
+                            f"netlink request failed: {os.strerror(err)}"
+                        )
+                    continue
+                replies.append(reply)
+
+    def read(self, timeout: float | None = 0) -> list[tuple[int, bytes]]:
+        """Return (type, payload) of pending notifications, waiting up to
+        `timeout` seconds (None for no limit) for the first. If some were
+        lost (the receive buffer overflowed), (NLMSG_OVERRUN, b"") is
+        included; i.e. current state should be re-read."""
+        if not select.select([self.sock], [], [], timeout)[0]:
+            return []
+
+        messages = []
+        while True:
+            try:
+                data = self.sock.recv(64 * 1024, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    messages.append((NLMSG_OVERRUN, b""))
+                    continue
+                raise RtnetlinkError(f"netlink receive failed: {e}")
+            messages.extend(
+                (msg_type, payload)
+                for msg_type, _, payload in parse_messages(data)
+            )
+        return messages
+
+    def get_links(self) -> list[Link]:
+        payload = _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        return [
+            parse_link(reply)
+            for reply in self.request_dump(RTM_GETLINK, payload)
+        ]
+
+    def get_addresses(self) -> list[Address]:
+        payload = _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        addresses = []
+        for reply in self.request_dump(RTM_GETADDR, payload):
+            addr = parse_address(reply)
+            if addr is not None:
+                addresses.append(addr)
+        return addresses
+
+
+def dump() -> dict[str, Link]:
+    """Return all links (by name), with their addresses and bridge (or
+    bond) membership"""
+    with Rtnetlink() as rtnl:
+        links = rtnl.get_links()
+        addresses = rtnl.get_addresses()
+
+    by_index = {link.index: link for link in links}
+    for addr in addresses:
+        link = by_index.get(addr.ifindex)
+        if link is not None:
+            link.addresses.append(addr)
+    return {link.name: link for link in links}
+
+
+def get_ports(links: dict[str, Link], master: str) -> list[str]:
+    """Return the names of the ports of bridge (or bond) `master`"""
+    if master not in links:
+        return []
+    index = links[master].index
+    return sorted(link.name for link in links.values() if link.master == index)